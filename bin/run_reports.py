@@ -5,17 +5,20 @@ with latest / specified assay config file
 """
 
 import argparse
-from collections import Counter, defaultdict
+from collections import Counter
+import concurrent
 from datetime import datetime
 import json
-from os import makedirs, path, remove
+from os import makedirs, path
+import random
+import re
 from time import sleep
-from typing import List
+from typing import List, Union
 
 import dxpy
 
 from utils.dx_manage import (
-    check_archival_state,
+    check_archival_state_bulk,
     check_job_state,
     unarchive_files,
     create_folder,
@@ -37,23 +40,50 @@ from utils.dx_manage import (
 
 from utils.utils import (
     add_clarity_data_back_to_samples,
+    bulk_describe,
+    cached_bulk_describe,
     call_in_parallel,
     filter_non_unique_specimen_ids,
     filter_clarity_samples_with_no_reports,
     group_samples_by_project,
     group_dx_objects_by_project,
     filter_reports_with_variants,
+    generate_manifest,
     limit_samples,
     parse_config,
     parse_clarity_export,
     parse_sample_identifiers,
+    positive_int,
     validate_test_codes,
-    write_manifest,
     write_to_log,
     read_from_log
 )
 
 
+# matches names of SNV (dias_reports) and CNV (dias_cnvreports) reports
+# workflows launched by dias batch, capturing 'cnv' for the latter
+REPORTS_WORKFLOW_REGEX = re.compile(r'dias_(cnv)?reports')
+
+# job / analysis states where they have not completed successfully
+FAILED_STATES = frozenset({'failed', 'partially_failed'})
+
+# inputs to eggd_dias_batch that may be given to --batch_inputs
+VALID_BATCH_INPUTS = frozenset({
+    "assay_config_dir",
+    "cnv_call_job_id",
+    "exclude_samples",
+    "manifest_subset",
+    "qc_file",
+    "multiqc_report",
+    "assay_config_file",
+    "exclude_samples_file",
+    "exclude_controls",
+    "split_tests",
+    "sample_limit",
+    "unarchive",
+})
+
+
 def configure_inputs(clarity_data, assay, limit, start_date, end_date, unarchive):
     """
     Searches all 002 projects against given sample list to find
@@ -104,7 +134,7 @@ def configure_inputs(clarity_data, assay, limit, start_date, end_date, unarchive
     projects = get_projects(assay=assay)
 
     reports = get_xlsx_reports(
-        all_samples=list(clarity_data.keys()),
+        all_samples=clarity_data,
         projects=list(projects.keys())
     )
 
@@ -162,114 +192,107 @@ def configure_inputs(clarity_data, assay, limit, start_date, end_date, unarchive
     # - unhandled instances of multiple CNV call jobs or Dias single
     # - unarchiving / archived files
     # - missing / multiple multiQC reports in given single dir
-    manual_review = defaultdict(dict)
-
-    for project_id, project_data in project_samples.items():
-        print(
-            f"\nChecking project data for {project_data['project_name']} "
-            f"({project_id})"
-        )
-        cnv_jobs = get_cnv_call_job(
-            project=project_id,
-            selected_jobs=manual_cnv_call_jobs
-        )
-        dias_single_paths = get_single_dir(
-            project=project_id,
-            selected_paths=manual_dias_single_paths
-        )
+    manual_review = {}
 
-        multiqc_report = get_multiqc_report(
-            single_path=dias_single_paths[0]
-        )
+    archival_states = check_archival_state_bulk(
+        project_samples=project_samples
+    )
 
-        if len(cnv_jobs) == 0:
-            # no CNV reports, raise error if this is for CEN, print
-            # warning if this is WES (for now)
-            if assay == 'CEN':
-                manual_review[project_id]['cnv_call'] = 'No CNV call job found'
-            else:
-                print(
-                    '\nWARNING: no CNV calling job found for '
-                    f'{project_data["project_name"]} ({project_id}), '
-                    'continuing with job launching since this is for WES\n'
-                )
-        elif len(cnv_jobs) > 1:
-            # unhandled multiple CNV call job => throw in error bucket
-            manual_review[project_id]['cnv_call'] = cnv_jobs
-        else:
-            # add in CNV call job ID for current project
-            project_samples[project_id]['cnv_call_job_id'] = cnv_jobs[0]
+    # check each project concurrently since these are all independent
+    # DNAnexus queries, updating the shared dicts only as each returns
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        concurrent_jobs = {
+            executor.submit(
+                check_project,
+                project_id=project_id,
+                project_data=project_data,
+                assay=assay,
+                manual_cnv_call_jobs=manual_cnv_call_jobs,
+                manual_dias_single_paths=manual_dias_single_paths
+            ): project_id
+            for project_id, project_data in project_samples.items()
+        }
 
-        if len(dias_single_paths) > 1:
-            # unhandled multiple Dias single output => throw in error bucket
-            manual_review[project_id]['dias_single'] = dias_single_paths
-        else:
-            project_samples[project_id]['dias_single'] = dias_single_paths[0]
+        for future in concurrent.futures.as_completed(concurrent_jobs):
+            project_id = concurrent_jobs[future]
 
-        # verify found single multiQC report in single dir
-        if len(multiqc_report) == 0:
-            manual_review[project_id]['multiqc'] = None
-        elif len(multiqc_report) > 1:
-            manual_review[project_id]['multiqc'] = multiqc_report
-        else:
-            project_samples[project_id]['multiqc'] = multiqc_report[0]
+            try:
+                project_inputs, project_issues = future.result()
+            except Exception as exc:
+                print(f"\nError checking project data for {project_id}: {exc}")
+                raise exc
 
+            project_data = project_samples[project_id]
+            project_data.update(project_inputs)
 
-        _, unarchiving, archived = check_archival_state(
-            project=project_id, sample_data=project_data
-        )
+            _, unarchiving, archived = archival_states[project_id]
 
-        if unarchiving:
-            manual_review[project_id]['unarchiving'] = unarchiving
+            if unarchiving:
+                project_issues['unarchiving'] = unarchiving
 
-        if archived:
-            manual_review[project_id]['archived'] = archived
+            if archived:
+                project_issues['archived'] = archived
 
-        if manual_review.get(project_id):
-            # project has issues, add project name for nicer printing
-            manual_review[project_id][
-                'project_name'] = project_data['project_name']
+            if project_issues:
+                # project has issues, add project name for nicer printing
+                project_issues['project_name'] = project_data['project_name']
+                manual_review[project_id] = project_issues
 
     if manual_review:
-        # one or more issues with some samples
-        print("\nWarning - one or more projects have issues...")
+        # one or more issues with some samples, build up the full summary
+        # of issues across all projects and print once
+        issue_lines = ["\nWarning - one or more projects have issues..."]
+
         for project_id, issues in manual_review.items():
-            print(f"\nIssues with {issues['project_name']} ({project_id}):")
+            cnv_call = issues.get('cnv_call')
+            dias_single = issues.get('dias_single')
+            unarchiving = issues.get('unarchiving')
+            archived = issues.get('archived')
+            project_name = issues['project_name']
+
+            issue_lines.append(
+                f"\nIssues with {project_name} ({project_id}):"
+            )
 
-            if issues.get('cnv_call'):
-                print(
+            if cnv_call:
+                issue_lines.append(
                     "\tProject has not got a single CNV calling job and is "
-                    f"not specified in config: {issues.get('cnv_call')}"
+                    f"not specified in config: {cnv_call}"
                 )
 
-            if issues.get('dias_single'):
-                print(
+            if dias_single:
+                issue_lines.append(
                     "\tProject has more than one Dias single output dir and "
-                    f"is not specified in config: {issues.get('dias_single')}"
+                    f"is not specified in config: {dias_single}"
                 )
 
-            if issues.get('unarchiving'):
-                print(
-                    f"\t{len(issues.get('unarchiving'))} files are "
-                    "still unarchiving"
+            if unarchiving:
+                issue_lines.append(
+                    f"\t{len(unarchiving)} files are still unarchiving"
                 )
 
-            if issues.get('archived'):
-                print(
-                    f"\t{len(issues.get('archived'))} required files are in "
-                    "an archived state"
+            if archived:
+                issue_lines.append(
+                    f"\t{len(archived)} required files are in an archived "
+                    "state"
                 )
 
-            if issues.get('multiqc'):
-                print(
-                    "Did not find single multiQC report in project: "
-                    f"{issues.get('multiqc')}"
+            if 'multiqc' in issues:
+                # value is None where no report was found
+                issue_lines.append(
+                    "\tDid not find single multiQC report in project: "
+                    f"{issues['multiqc']}"
                 )
 
-        if unarchive and [x.get('archived') for x in manual_review.values()]:
+        print("\n".join(issue_lines))
+
+        if unarchive and any(
+            x.get('archived') for x in manual_review.values()
+        ):
             unarchive_files(
                 project_files={
                     k: v['archived'] for k, v in manual_review.items()
+                    if v.get('archived')
                 }
             )
 
@@ -279,7 +302,181 @@ def configure_inputs(clarity_data, assay, limit, start_date, end_date, unarchive
     return project_samples
 
 
-def run_all_batch_jobs(args, all_sample_data) -> list:
+def check_project(
+    project_id,
+    project_data,
+    assay,
+    manual_cnv_call_jobs,
+    manual_dias_single_paths
+    ) -> Union[dict, dict]:
+    """
+    Check a single project for the CNV call job, Dias single output
+    and multiQC report required for running reports
+
+    Parameters
+    ----------
+    project_id : str
+        ID of project to check
+    project_data : dict
+        project name and sample data for the project
+    assay : str
+        assay to run reports for
+    manual_cnv_call_jobs : dict
+        mapping of project ID to manually selected CNV call job ID
+    manual_dias_single_paths : dict
+        mapping of project ID to manually selected Dias single path
+
+    Returns
+    -------
+    dict
+        mapping of found CNV call job ID, Dias single path and multiQC
+        report ID to add to the project data
+    dict
+        mapping of any issues found that require manual review
+    """
+    project_name = project_data['project_name']
+
+    print(f"\nChecking project data for {project_name} ({project_id})")
+    project_inputs = {}
+    project_issues = {}
+
+    # find the CNV call job whilst finding the Dias single output and
+    # multiQC report in it, since these are independent queries
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        cnv_future = executor.submit(
+            get_cnv_call_job,
+            project=project_id,
+            selected_jobs=manual_cnv_call_jobs
+        )
+
+        dias_single_paths = get_single_dir(
+            project=project_id,
+            selected_paths=manual_dias_single_paths
+        )
+
+        multiqc_report = get_multiqc_report(
+            single_path=dias_single_paths[0]
+        )
+
+        cnv_jobs = cnv_future.result()
+
+    if len(cnv_jobs) == 0:
+        # no CNV reports, raise error if this is for CEN, print
+        # warning if this is WES (for now)
+        if assay == 'CEN':
+            project_issues['cnv_call'] = 'No CNV call job found'
+        else:
+            print(
+                '\nWARNING: no CNV calling job found for '
+                f'{project_name} ({project_id}), '
+                'continuing with job launching since this is for WES\n'
+            )
+    elif len(cnv_jobs) > 1:
+        # unhandled multiple CNV call job => throw in error bucket
+        project_issues['cnv_call'] = cnv_jobs
+    else:
+        # add in CNV call job ID for current project
+        project_inputs['cnv_call_job_id'] = cnv_jobs[0]
+
+    if len(dias_single_paths) > 1:
+        # unhandled multiple Dias single output => throw in error bucket
+        project_issues['dias_single'] = dias_single_paths
+    else:
+        project_inputs['dias_single'] = dias_single_paths[0]
+
+    # verify found single multiQC report in single dir
+    if len(multiqc_report) == 0:
+        project_issues['multiqc'] = None
+    elif len(multiqc_report) > 1:
+        project_issues['multiqc'] = multiqc_report
+    else:
+        project_inputs['multiqc'] = multiqc_report[0]
+
+    return project_inputs, project_issues
+
+
+def launch_batch_job(
+    project,
+    project_data,
+    args,
+    batch_app_id,
+    now,
+    codes_to_strip
+    ) -> str:
+    """
+    Write and upload the manifest for a single project and launch
+    dias batch with it
+
+    Parameters
+    ----------
+    project : str
+        ID of original 002 project of the samples
+    project_data : dict
+        all sample data required for the project
+    args : argparse.Namespace
+        parsed arguments from command line
+    batch_app_id : str
+        app ID of latest version of eggd_dias_batch
+    now : str
+        current datetime for naming
+    codes_to_strip : list
+        list of test codes to not add to the manifest
+
+    Returns
+    -------
+    str
+        job ID of launched dias batch job
+    """
+    project_name = project_data['project_name']
+
+    if args.test_project:
+        batch_project = args.test_project
+    else:
+        batch_project = project
+
+    manifest = generate_manifest(
+        sample_data=project_data['samples'],
+        ignore_codes=codes_to_strip
+    )
+    manifest_name = f"{project_name}-{now}_reanalysis.manifest"
+
+    create_folder(
+        project=batch_project,
+        path=f"/manifests/{now}"
+    )
+
+    manifest_id = upload_manifest(
+        manifest=manifest,
+        name=manifest_name,
+        project=batch_project,
+        path=f"/manifests/{now}"
+    )
+
+    # name for naming dias batch job
+    name = f"eggd_dias_batch_{project_name}"
+
+    batch_id = run_batch(
+        project=batch_project,
+        batch_app_id=batch_app_id,
+        cnv_job=project_data.get('cnv_call_job_id'),
+        single_path=project_data['dias_single'],
+        manifest=manifest_id,
+        multiqc_report_id=project_data['multiqc'],
+        name=name,
+        batch_inputs=args.batch_inputs,
+        assay=args.assay,
+        terminate=args.terminate
+    )
+
+    print(
+        f"Launched dias batch job in {batch_project} ({batch_id}) "
+        f"with manifest {manifest_name}"
+    )
+
+    return batch_id
+
+
+def run_all_batch_jobs(args, all_sample_data, log_file) -> list:
     """
     Main function to configure all inputs for running dias batch against
     every 002 project
@@ -290,6 +487,9 @@ def run_all_batch_jobs(args, all_sample_data) -> list:
         parsed arguments from command line
     all_sample_data : dict
         mapping of project ID to all sample data required
+    log_file : str
+        name of JSON log to write launched job IDs to if launching
+        fails for any project
 
     Returns
     -------
@@ -302,73 +502,78 @@ def run_all_batch_jobs(args, all_sample_data) -> list:
 
     launched_jobs = []
 
-    for project, project_data in all_sample_data.items():
+    # test codes to ignore are the same for every project => read once
+    if args.ignore_test_codes:
+        codes_project, codes_file = args.ignore_test_codes.split(':')
+        codes_to_strip = dxpy.DXFile(
+            dxid=codes_file,
+            project=codes_project
+        ).read().splitlines()
+    else:
+        codes_to_strip = []
+
+    # launch for each project concurrently since the manifest upload
+    # and job launching for each are independent of one another
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        concurrent_jobs = {
+            executor.submit(
+                launch_batch_job,
+                project=project,
+                project_data=project_data,
+                args=args,
+                batch_app_id=batch_app_id,
+                now=now,
+                codes_to_strip=codes_to_strip
+            ): project for project, project_data in all_sample_data.items()
+        }
 
-        if args.test_project:
-            batch_project = args.test_project
-        else:
-            batch_project = project
-
-        if args.ignore_test_codes:
-            codes_project, codes_file = args.ignore_test_codes.split(':')
-            dxpy.bindings.dxfile_functions.download_dxfile(
-                codes_file,
-                "codes.txt",
-                project=codes_project
-            )
-            with open("codes.txt") as f:
-                codes_to_strip = f.read().splitlines()
-            remove("codes.txt")
-        else:
-            codes_to_strip = []
+        error = None
 
-        manifest = write_manifest(
-            sample_data=project_data['samples'],
-            project_name=project_data['project_name'],
-            now=now,
-            ignore_codes=codes_to_strip
-        )
+        for future in concurrent.futures.as_completed(concurrent_jobs):
+            if future.cancelled():
+                continue
 
-        create_folder(
-            project=batch_project,
-            path=f"/manifests/{now}"
-        )
+            try:
+                launched_jobs.append(future.result())
+            except Exception as exc:
+                print(
+                    "\nError launching dias batch for "
+                    f"{concurrent_jobs[future]}: {exc}"
+                )
+                error = error or exc
 
-        manifest_id = upload_manifest(
-            manifest=manifest,
-            project=batch_project,
-            path=f"/manifests/{now}"
-        )
+                # stop any projects not yet started from launching, those
+                # already running are left to finish so that every job
+                # launched gets recorded before raising
+                for pending in concurrent_jobs:
+                    pending.cancel()
 
-        # name for naming dias batch job
-        name = f"eggd_dias_batch_{project_data['project_name']}"
-
-        batch_id = run_batch(
-            project=batch_project,
-            batch_app_id=batch_app_id,
-            cnv_job=project_data.get('cnv_call_job_id'),
-            single_path=project_data['dias_single'],
-            manifest=manifest_id,
-            multiqc_report_id=project_data['multiqc'],
-            name=name,
-            batch_inputs=args.batch_inputs,
-            assay=args.assay,
-            terminate=args.terminate
-        )
+    if error:
+        if launched_jobs:
+            print(
+                "\nJobs launched before stopping: "
+                f"{', '.join(launched_jobs)}"
+            )
 
-        print(
-            f"Launched dias batch job in {batch_project} ({batch_id}) "
-            f"with manifest {manifest}"
-        )
+            write_to_log(
+                log_file=log_file,
+                key='dias_batch',
+                job_ids=launched_jobs
+            )
 
-        launched_jobs.append(batch_id)
+        raise error
 
     print(f"Launched {len(launched_jobs)} Dias batch jobs")
 
     return launched_jobs
 
 
-def monitor_launched_jobs(job_ids, mode) -> None:
+def monitor_launched_jobs(
+    job_ids,
+    mode,
+    poll_interval=120,
+    status_every=1
+    ) -> None:
     """
     Monitor launched Dias batch jobs or reports workflows to ensure all
     complete and alert of any fails to investigate
@@ -379,10 +584,15 @@ def monitor_launched_jobs(job_ids, mode) -> None:
         list of job IDs
     mode : str
         string of batch or reports for prettier printing
+    poll_interval : int
+        maximum no. of seconds to back off to between checking job
+        states whilst none are changing
+    status_every : int
+        print the summary of job states every n polls
     """
-    failed_jobs = []
-    completed_jobs = []
-    terminated_jobs = []
+    failed_jobs = set()
+    completed_jobs = set()
+    terminated_jobs = set()
 
     if mode == "batch":
         mode = "dias batch jobs"
@@ -391,41 +601,81 @@ def monitor_launched_jobs(job_ids, mode) -> None:
 
     print(f"\nMonitoring state of launched {mode}...\n")
 
+    # poll quickly whilst jobs are changing state, backing off up to
+    # every poll_interval seconds whilst nothing is changing
+    interval = min(5, poll_interval)
+    polls = 0
+
+    job_ids = set(job_ids)
+    last_state_counts = None
+
+    # finished jobs are no longer polled, keep a running total of their
+    # states to include in the summary printed each poll
+    finished_states = Counter()
+
     while job_ids:
         job_states = get_job_states(job_ids)
-        printable_states = " | ".join(
-            [f"{x[0]}: {x[1]}" for x in Counter(job_states.values()).items()]
-        )
 
-        # split failed, terminated (when testing) and done to stop monitoring
-        failed = [
-            k
-            for k, v in job_states.items()
-            if v in ["failed", "partially failed"]
-        ]
-        done = [k for k, v in job_states.items() if v == "done"]
-        terminated = [k for k, v in job_states.items() if v == "terminated"]
+        # count states and split failed, terminated (when testing) and
+        # done to stop monitoring in a single pass
+        failed, done, terminated = [], [], []
+        in_progress = set()
+        in_progress_states = Counter()
+
+        for job_id, state in job_states.items():
+            if state in FAILED_STATES:
+                failed.append(job_id)
+            elif state == "done":
+                done.append(job_id)
+            elif state == "terminated":
+                terminated.append(job_id)
+            else:
+                in_progress.add(job_id)
+                in_progress_states[state] += 1
+                continue
+
+            finished_states[state] += 1
 
-        failed_jobs.extend(failed)
-        terminated_jobs.extend(terminated)
-        completed_jobs.extend(done)
+        failed_jobs.update(failed)
+        terminated_jobs.update(terminated)
+        completed_jobs.update(done)
 
-        job_ids = list(set(job_ids) - set(failed))
-        job_ids = list(set(job_ids) - set(done))
-        job_ids = list(set(job_ids) - set(terminated))
+        job_ids = in_progress
+
+        # only rebuild the summary of states when these have changed
+        state_counts = tuple(
+            sorted((in_progress_states + finished_states).items())
+        )
+
+        if state_counts != last_state_counts:
+            printable_states = " | ".join(
+                [f"{x[0]}: {x[1]}" for x in state_counts]
+            )
+            last_state_counts = state_counts
 
         if not job_ids:
             break
 
-        print(
-            f"Waiting on {len(job_ids)} {mode} to "
-            f"complete ({printable_states})"
-        )
-        sleep(30)
+        if failed or done or terminated:
+            interval = min(5, poll_interval)
+        else:
+            interval = min(interval * 1.5, poll_interval)
+
+        if polls % status_every == 0:
+            print(
+                f"Waiting on {len(job_ids)} {mode} to "
+                f"complete ({printable_states})"
+            )
+
+        polls += 1
+
+        # add up to 10% jitter to not poll in lock step with other runs
+        sleep(interval + random.uniform(0, interval * 0.1))
 
     print(
         f"Stopping monitoring launched jobs:\n\t{len(completed_jobs)} "
-        f"completed\n\t{len(failed_jobs)} failed ({', '.join(failed_jobs)})"
+        f"completed\n\t{len(failed_jobs)} failed "
+        f"({', '.join(sorted(failed_jobs))})"
     )
 
 
@@ -537,6 +787,24 @@ def parse_args() -> argparse.Namespace:
             "dias batch jobs"
         ),
     )
+    reanalysis_parser.add_argument(
+        "--poll_interval",
+        type=positive_int,
+        default=120,
+        help=(
+            "maximum no. of seconds to wait between checking the state of "
+            "jobs whilst monitoring (default: 120)"
+        )
+    )
+    reanalysis_parser.add_argument(
+        "--status_every",
+        type=positive_int,
+        default=1,
+        help=(
+            "print the summary of job states every n checks whilst "
+            "monitoring (default: 1)"
+        )
+    )
     reanalysis_parser.add_argument(
         "--ignore_test_codes",
         type=str,
@@ -563,6 +831,12 @@ def parse_args() -> argparse.Namespace:
             'path to directory to download reports to'
         )
     )
+    download_parser.add_argument(
+        '--force', action='store_true', default=False, help=(
+            'controls if to ignore locally cached describe details of jobs '
+            'and describe all jobs from DNAnexus again'
+        )
+    )
 
     args = parser.parse_args()
 
@@ -605,21 +879,7 @@ def verify_batch_inputs_argument(args):
             "Failed to parse --batch_inputs as JSON string"
         ) from exc
 
-    valid_inputs = {
-        "assay_config_dir",
-        "cnv_call_job_id",
-        "exclude_samples",
-        "manifest_subset",
-        "qc_file",
-        "multiqc_report",
-        "assay_config_file",
-        "exclude_samples_file",
-        "exclude_controls",
-        "split_tests",
-        "sample_limit" "unarchive",
-    }
-
-    invalid_inputs = set(args.batch_inputs.keys()) - valid_inputs
+    invalid_inputs = args.batch_inputs.keys() - VALID_BATCH_INPUTS
 
     assert (
         not invalid_inputs
@@ -628,7 +888,119 @@ def verify_batch_inputs_argument(args):
     return args
 
 
-def download_all_reports(log_file, output_path) -> None:
+def download_project_reports(project_id, project_data, output_path) -> None:
+    """
+    Downloads the xlsx reports with variants, coverage reports, artemis
+    file and multiQC report from the launched jobs of a single project
+
+    Parameters
+    ----------
+    project_id : str
+        ID of project the jobs were run in
+    project_data : dict
+        project name and describe details of jobs run in the project
+    output_path : str
+        path of where to download files to, files will be downloaded to
+        a sub directory named with the project name
+    """
+    project_name = project_data['project_name']
+
+    print(f"\nDownloading files for {project_name} ({project_id})\n")
+
+    # split out SNV and CNV reports workflows and eggd_artemis jobs
+    snv_report_jobs, cnv_report_jobs, artemis_jobs = [], [], []
+
+    for item in project_data['items']:
+        if item['id'].startswith('analysis-'):
+            match = REPORTS_WORKFLOW_REGEX.search(item['executableName'])
+
+            if match and match.group(1):
+                cnv_report_jobs.append(item)
+            elif match:
+                snv_report_jobs.append(item)
+        elif item['name'] == 'eggd_artemis':
+            artemis_jobs.append(item)
+
+    # get just snv and cnv reports (plus coverage reports) for reports
+    # where there are some variants filtered
+    snv_ids = filter_reports_with_variants(
+        reports=snv_report_jobs,
+        report_field='stage-rpt_generate_workbook.xlsx_report'
+    )
+
+    cnv_ids = filter_reports_with_variants(
+        reports=cnv_report_jobs,
+        report_field='stage-cnv_generate_workbook.xlsx_report'
+    )
+
+    artemis_links_ids = multiqc_ids = []
+
+    if artemis_jobs:
+        artemis_links_ids = [
+            x['output']['url_file']['$dnanexus_link'] for x in artemis_jobs
+            if x['output']
+        ]
+
+        multiqc_ids = [
+            x['input']['multiqc_report']['$dnanexus_link']
+            for x in artemis_jobs
+            if x['input'].get('multiqc_report', {}).get('$dnanexus_link')
+        ]
+
+    if not any([snv_ids, cnv_ids, artemis_links_ids]):
+        print(
+            f"\nNo reports with variants or eggd_artemis output to "
+            f"download for {project_name}"
+        )
+        return
+
+    # create local run dir for downloading to
+    project_path = path.join(output_path, project_name)
+    makedirs(project_path, exist_ok=True)
+
+    print(
+        f"Downloading {int(len(snv_ids) / 2) + len(cnv_ids)} xlsx reports, "
+        f"{int(len(snv_ids) / 2)} coverage reports, "
+        f"{len(artemis_links_ids)} links files and "
+        f"{len(multiqc_ids)} multiQC reports"
+    )
+
+    # drop any duplicate files (i.e. the same multiQC report given to
+    # more than one eggd_artemis job) whilst retaining order
+    all_file_ids = snv_ids + cnv_ids + artemis_links_ids + multiqc_ids
+    file_ids = list(dict.fromkeys(all_file_ids))
+
+    if len(file_ids) < len(all_file_ids):
+        print(
+            f"Skipping {len(all_file_ids) - len(file_ids)} duplicate files "
+            "from downloading"
+        )
+
+    # describe all files in one go for their names and parts, so that
+    # each file is not described again before (and during) downloading
+    file_details = {
+        x['id']: x for x in bulk_describe(file_ids, fields={'parts'})
+    }
+
+    # any files that could not be described (i.e. since deleted) have
+    # already been warned on, skip these instead of describing them
+    # again individually just to catch the error raised
+    file_ids = [x for x in file_ids if x in file_details]
+
+    call_in_parallel(
+        download_single_file,
+        file_ids,
+        ignore_missing=True,
+        project=project_id,
+        path=project_path,
+        file_details=file_details,
+        max_workers=8
+    )
+
+    print(f"\nCompleted downloading files to {project_path}")
+
+
+def download_all_reports(log_file, output_path, force=False) -> None:
     """
     Downloads all output xlsx reports, coverage reports, artemis files
     and multiQC reports from the given log file of dias batch jobs.
@@ -646,6 +1018,9 @@ def download_all_reports(log_file, output_path) -> None:
         log file to read job IDs from
     output_path : str
         path of where to download files to
+    force : bool
+        controls if to ignore any locally cached describe details of jobs
+        and describe all jobs from DNAnexus again
 
     Raises
     ------
@@ -656,7 +1031,12 @@ def download_all_reports(log_file, output_path) -> None:
     batch_job_ids = job_ids.get('dias_batch')
 
     # get the launched jobs of all logged batch jobs
-    batch_details = call_in_parallel(dxpy.describe, batch_job_ids)
+    batch_details = cached_bulk_describe(
+        batch_job_ids,
+        fields={'id', 'state', 'output'},
+        default_fields=False,
+        force=force
+    )
     launched_job_ids = [
         x['output'].get('launched_jobs', '').split(',') for x in batch_details
     ]
@@ -668,7 +1048,19 @@ def download_all_reports(log_file, output_path) -> None:
         "launched jobs...\n"
     )
 
-    job_details = call_in_parallel(dxpy.describe, launched_job_ids)
+    # only request the fields used for checking states and downloading
+    # outputs, since the full describe of each job / analysis is large,
+    # jobs in a final state are cached locally to not describe them again
+    # on subsequent runs to download
+    job_details = cached_bulk_describe(
+        launched_job_ids,
+        fields={
+            'id', 'project', 'name', 'executableName', 'state',
+            'input', 'output'
+        },
+        default_fields=False,
+        force=force
+    )
 
     # check the state of all launched jobs before downloading
     all_job_states = check_job_state(job_details)
@@ -683,79 +1075,41 @@ def download_all_reports(log_file, output_path) -> None:
 
     project_job_details = group_dx_objects_by_project(job_details)
 
-    count = 0
-
-    for project_id, project_data in project_job_details.items():
-        count += 1
-        print(
-            f"\n[{count}/{len(project_job_details.keys())}] Downloading "
-            f"files for {project_data['project_name']} ({project_id})\n"
-        )
-
-        snv_report_jobs = [
-            x for x in project_data['items'] if x['id'].startswith('analysis-')
-            and 'dias_reports' in x['executableName']
-        ]
-        cnv_report_jobs = [
-            x for x in project_data['items'] if x['id'].startswith('analysis-')
-            and 'dias_cnvreports' in x['executableName']
-        ]
-        artemis_jobs = [
-            x for x in project_data['items'] if x['name'] == 'eggd_artemis'
-        ]
-
-        # get just snv and cnv reports (plus coverage reports) for reports
-        # where there are some variants filtered
-        snv_ids = filter_reports_with_variants(
-            reports=snv_report_jobs,
-            report_field='stage-rpt_generate_workbook.xlsx_report'
-        )
-
-        cnv_ids = filter_reports_with_variants(
-            reports=cnv_report_jobs,
-            report_field='stage-cnv_generate_workbook.xlsx_report'
-        )
+    print(
+        f"\nDownloading files from {len(project_job_details.keys())} "
+        "projects\n"
+    )
 
-        artemis_links_ids = multiqc_ids = []
+    count = 0
 
-        if artemis_jobs:
-            artemis_links_ids = [
-                x['output']['url_file']['$dnanexus_link'] for x in artemis_jobs
-                if x['output']
-            ]
+    # download from multiple projects concurrently, with the files in each
+    # project also downloaded in parallel within download_project_reports
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        concurrent_jobs = {
+            executor.submit(
+                download_project_reports,
+                project_id=project_id,
+                project_data=project_data,
+                output_path=output_path
+            ): project_id
+            for project_id, project_data in project_job_details.items()
+        }
 
-            multiqc_ids = [
-                x['input']['multiqc_report'] for x in artemis_jobs
-                if x['input'].get('multiqc_report', {}).get('$dnanexus_link')
-            ]
+        for future in concurrent.futures.as_completed(concurrent_jobs):
+            try:
+                future.result()
+            except Exception as exc:
+                print(
+                    "\nError downloading files for "
+                    f"{concurrent_jobs[future]}: {exc}"
+                )
+                raise exc
 
-        if not any([snv_ids, cnv_ids, artemis_links_ids]):
+            count += 1
             print(
-                f"\nNo reports with variants or eggd_artemis output to "
-                f"download for {project_data['project_name']}"
+                f"\n[{count}/{len(project_job_details.keys())}] projects "
+                "completed downloading"
             )
-            continue
-
-        # create local run dir for downloading to
-        project_path = path.join(output_path, project_data['project_name'])
-        makedirs(project_path, exist_ok=True)
-
-        print(
-            f"Downloading {int(len(snv_ids) / 2) + len(cnv_ids)} xlsx reports, "
-            f"{int(len(snv_ids) / 2)} coverage reports, "
-            f"{len(artemis_links_ids)} links files and "
-            f"{len(multiqc_ids)} multiQC reports"
-        )
-
-        call_in_parallel(
-            download_single_file,
-            snv_ids + cnv_ids + artemis_links_ids + multiqc_ids,
-            ignore_missing=True,
-            project=project_id,
-            path=project_path
-        )
-
-        print(f"\nCompleted downloading files to {project_path}")
 
 
 def main():
@@ -764,7 +1118,8 @@ def main():
     if args.mode == 'download':
         download_all_reports(
             log_file=args.job_log,
-            output_path=args.path
+            output_path=args.path,
+            force=args.force
         )
         exit()
 
@@ -806,7 +1161,11 @@ def main():
     now = datetime.today().strftime('%y%m%d_%H%M')
     launched_job_log = f"launched_jobs_{now}_log.json"
 
-    batch_job_ids = run_all_batch_jobs(args=args, all_sample_data=sample_data)
+    batch_job_ids = run_all_batch_jobs(
+        args=args,
+        all_sample_data=sample_data,
+        log_file=launched_job_log
+    )
 
     write_to_log(
         log_file=launched_job_log,
@@ -815,7 +1174,12 @@ def main():
     )
 
     if args.monitor and batch_job_ids:
-        monitor_launched_jobs(batch_job_ids, mode="batch")
+        monitor_launched_jobs(
+            batch_job_ids,
+            mode="batch",
+            poll_interval=args.poll_interval,
+            status_every=args.status_every
+        )
 
         # monitor the launched reports workflows
         artemis_ids, report_ids = get_launched_workflow_ids(batch_job_ids)
@@ -832,7 +1196,12 @@ def main():
             job_ids= artemis_ids
         )
 
-        monitor_launched_jobs(report_ids, mode="reports")
+        monitor_launched_jobs(
+            report_ids,
+            mode="reports",
+            poll_interval=args.poll_interval,
+            status_every=args.status_every
+        )
 
 if __name__ == "__main__":
 
@@ -6,13 +6,25 @@ from datetime import datetime
 import os
 from pathlib import Path
 import re
-from typing import List, Union
+from typing import List, Union, TYPE_CHECKING
 
 import dxpy
-import pandas as pd
-from tqdm import tqdm
 
-from .utils import call_in_parallel
+if TYPE_CHECKING:
+    # pandas is imported on use since it is slow to import and not
+    # required when running in download mode
+    import pandas as pd
+
+from .utils import bulk_describe, cached_bulk_describe
+
+
+# local directory to cache parsed genepanels files in, these are keyed by
+# file ID since DNAnexus files are immutable once closed
+GENEPANELS_CACHE_DIR = os.path.expanduser('~/.cache/dias_reports')
+
+# run ID as found in names of single sample eggd_artemis xlsx outputs
+# (example run ID: 240229_A01295_0328_BHYG25DRX3)
+ARTEMIS_RUN_ID_REGEX = re.compile(r'[\d]+_[A-Z][\d]+_[\d]{4}_[\w][^_]+')
 
 
 def check_archival_state(project, sample_data) -> Union[list, list, list]:
@@ -22,8 +34,8 @@ def check_archival_state(project, sample_data) -> Union[list, list, list]:
 
     Parameters
     ----------
-    project : list
-        list of project IDs to use as search scope
+    project : str
+        project ID to use as search scope
     sample_data : list
         list of dicts of per sample details to get samplename from
 
@@ -36,7 +48,9 @@ def check_archival_state(project, sample_data) -> Union[list, list, list]:
     list
         list of file objects in archived state
     """
-    print("Checking archival state of required files")
+    # this is called for multiple projects concurrently, prefix all
+    # output with the project so that it can be followed
+    print(f"[{project}] Checking archival state of required files")
 
     # patterns of sample files required for SNV reports, CNV reports
     # and Artemis
@@ -51,12 +65,18 @@ def check_archival_state(project, sample_data) -> Union[list, list, list]:
         'bam.bai$'
     ]
 
-    # build regex patterns of all files for all samples in blocks of 100
+    # build one regex pattern per sample matching any of the required
+    # files as a single group, these are searched for in blocks of 100
+    file_group = f"(?:{'|'.join(sample_file_patterns)})"
+
     samples = list(set([x['sample'] for x in sample_data['samples']]))
-    files = [f"{x}.*{y}" for x in samples for y in sample_file_patterns]
+    files = [f"{x}.*{file_group}" for x in samples]
     files.append(".*_excluded_intervals.bed")
 
-    print(f"{len(files)} sample files to search for")
+    print(
+        f"[{project}] Searching for {len(sample_file_patterns)} files for "
+        f"each of {len(samples)} samples"
+    )
 
     file_details = find_in_parallel(
         project=project,
@@ -64,20 +84,78 @@ def check_archival_state(project, sample_data) -> Union[list, list, list]:
     )
 
     # TODO - return something useful from this on states
-    print(f"Found {len(file_details)} files")
+    print(f"[{project}] Found {len(file_details)} files")
+
+    # split files by state in a single pass, any in other states
+    # (i.e. archival) are not returned
+    states = {'live': [], 'unarchiving': [], 'archived': []}
+
+    for file in file_details:
+        state = states.get(file['describe']['archivalState'])
 
-    live = [x for x in file_details if x['describe']['archivalState'] == 'live']
-    unarchiving = [x for x in file_details if x['describe']['archivalState'] == 'unarchiving']
-    archived = [x for x in file_details if x['describe']['archivalState'] == 'archived']
+        if state is not None:
+            state.append(file)
+
+    live = states['live']
+    unarchiving = states['unarchiving']
+    archived = states['archived']
 
     print(
-        f"Archival state(s): live {len(live)} | archived {len(archived)} | "
-        f"unarchiving {len(unarchiving)}"
+        f"[{project}] Archival state(s): live {len(live)} | "
+        f"archived {len(archived)} | unarchiving {len(unarchiving)}"
     )
 
     return live, unarchiving, archived
 
 
+def check_archival_state_bulk(project_samples) -> dict:
+    """
+    Check the archival state of required files for all given projects,
+    calling check_archival_state() for each project concurrently
+
+    Parameters
+    ----------
+    project_samples : dict
+        mapping of project ID -> project data containing list of samples
+
+    Returns
+    -------
+    dict
+        mapping of project ID -> tuple of live, unarchiving and archived
+        file object lists
+
+    Raises
+    ------
+    Exception
+        Raised if checking the archival state for any project fails
+    """
+    archival_states = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        concurrent_jobs = {
+            executor.submit(
+                check_archival_state,
+                project=project_id,
+                sample_data=project_data
+            ): project_id
+            for project_id, project_data in project_samples.items()
+        }
+
+        for future in concurrent.futures.as_completed(concurrent_jobs):
+            # access returned output as each is returned in any order
+            try:
+                archival_states[concurrent_jobs[future]] = future.result()
+            except Exception as exc:
+                # catch any errors that might get raised during querying
+                print(
+                    "Error checking archival state for "
+                    f"{concurrent_jobs[future]}: {exc}"
+                )
+                raise exc
+
+    return archival_states
+
+
 def check_job_state(jobs) -> dict:
     """
     Checks the job state of all jobs
@@ -163,9 +241,11 @@ def unarchive_files(project_files) -> None:
     RuntimeError
         Raised if unarchiving fails for a set of project files
     """
+    all_ids = [x['id'] for y in project_files.values() for x in y]
+
     print(
-        f"\nUnarchiving {len([x for y in project_files.values() for x in y])} "
-        f"files in {len(project_files.keys())} project(s)..."
+        f"\nUnarchiving {len(all_ids)} files in "
+        f"{len(project_files.keys())} project(s)..."
     )
 
     for project, files in project_files.items():
@@ -189,13 +269,13 @@ def unarchive_files(project_files) -> None:
     # build a handy command to dump into the stdout for people to check
     # the state of all of the files we're unarchiving later on
     check_state_cmd = (
-        f"echo {' '.join([x['id'] for y in project_files.values() for x in y])}"
+        f"echo {' '.join(all_ids)}"
         " | xargs -n1 -d' ' -P32 -I{} bash -c 'dx describe --json {} ' | "
         "grep archival | uniq -c"
     )
 
     print(
-        f"\n \nUnarchiving requested for {len(files)} files, this "
+        f"\n \nUnarchiving requested for {len(all_ids)} files, this "
         "will take some time...\n \n"
     )
 
@@ -207,7 +287,7 @@ def unarchive_files(project_files) -> None:
     exit()
 
 
-def download_single_file(dxid, project, path) -> None:
+def download_single_file(dxid, project, path, file_details=None) -> None:
     """
     Given a single dx file ID, downloads it with the original filename
 
@@ -219,11 +299,23 @@ def download_single_file(dxid, project, path) -> None:
         project containing the file
     path : str
         path to download file to
+    file_details : dict | None
+        optional mapping of file ID -> describe details from already
+        describing the file(s) in bulk. If these include the `parts`
+        field they are also passed to download_dxfile to not describe
+        the file again. If not given or the file is not present the
+        file will be described to get the name
     """
+    details = (file_details or {}).get(dxid)
+
+    if not details:
+        details = dxpy.describe(dxid)
+
     dxpy.bindings.dxfile_functions.download_dxfile(
         dxid,
-        os.path.join(path, dxpy.describe(dxid).get('name')),
-        project=project
+        os.path.join(path, details.get('name')),
+        project=project,
+        describe_output=details
     )
 
 
@@ -248,12 +340,15 @@ def find_in_parallel(project, items, prefix='', suffix='') -> list:
     Call dxpy.find_data_objects in parallel for given list of `items`.
 
     All items in list are chunked into max 100 items and queried in one
-    go as a regex pattern for more efficient querying
+    go as a regex pattern for more efficient querying. If a list of
+    projects is given, every chunk is searched for in every project
+    from the same pool of threads.
 
     Parameters
     ----------
-    project : str
-        project ID in which to restrict search scope
+    project : str | list
+        project ID (or list of project IDs) in which to restrict search
+        scope
     items : list
         list of search terms to search for
     prefix : str
@@ -275,20 +370,23 @@ def find_in_parallel(project, items, prefix='', suffix='') -> list:
             describe={
                 'fields': {
                     'name': True,
-                    'archivalState': True,
-                    'createdBy': True
+                    'archivalState': True
                 }
             }
         ))
 
     results = []
 
+    if isinstance(project, str):
+        project = [project]
+
     # create chunks of 100 items from list for querying
     chunked_items = [items[i:i + 100] for i in range(0, len(items), 100)]
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=32) as executor:
         concurrent_jobs = {
-            executor.submit(_find, project, item) for item in chunked_items
+            executor.submit(_find, scope, item)
+            for scope in project for item in chunked_items
         }
 
         for future in concurrent.futures.as_completed(concurrent_jobs):
@@ -357,13 +455,29 @@ def get_job_states(job_ids) -> dict:
     -------
     dict
         mapping of job ID to it's state
-    """
-    job_state = {}
 
-    job_details = call_in_parallel(dxpy.describe, job_ids)
+    Raises
+    ------
+    RuntimeError
+        Raised if the state of any of the given jobs could not be
+        retrieved
+    """
+    job_details = bulk_describe(
+        job_ids, fields={'id', 'state'}, default_fields=False
+    )
 
     job_state = {job["id"]: job["state"] for job in job_details}
 
+    # bulk_describe skips any it can't describe, raise on these so that
+    # jobs don't silently drop out of being monitored
+    missing = [x for x in job_ids if x not in job_state]
+
+    if missing:
+        raise RuntimeError(
+            f"Failed to get the state of {len(missing)} job(s): "
+            f"{', '.join(missing)}"
+        )
+
     return job_state
 
 
@@ -384,7 +498,11 @@ def get_launched_workflow_ids(batch_ids) -> Union[list, list]:
     list
         list of reports analysis IDs
     """
-    details = call_in_parallel(func=dxpy.describe, items=batch_ids)
+    # describes of finished batch jobs are cached, with the same fields as
+    # requested for batch jobs in download mode to also be reused there
+    details = cached_bulk_describe(
+        batch_ids, fields={'id', 'state', 'output'}, default_fields=False
+    )
 
     # ensure we don't check failed batch jobs
     details = [x for x in details if x['state'] == 'done']
@@ -420,19 +538,22 @@ def get_projects(assay) -> List[dict]:
         list of dicts with details for each project
     """
 
+    # sort newest first by name (i.e. by run date) directly from the
+    # search generator
     projects = sorted(
         dxpy.bindings.search.find_projects(
             name=f"002_*{assay}",
             name_mode="glob",
-            describe=True,
+            describe={'fields': {'name': True}},
         ),
         key=lambda x: x["describe"]["name"],
+        reverse=True
     )
 
     print(f"Found {len(projects)} projects for {assay}")
 
     # turn list of projects to dict of id: describe
-    projects = {x['id']: x['describe'] for x in list(reversed(projects))}
+    projects = {x['id']: x['describe'] for x in projects}
 
     return projects
 
@@ -444,8 +565,9 @@ def get_xlsx_reports(all_samples, projects) -> list:
 
     Parameters
     ----------
-    samples : list
-        list of part of samplename to search for xlsx file for
+    all_samples : iterable
+        iterable (i.e. list or dict keyed by) of part of samplename to
+        search for xlsx file for
     projects : list
         list of project IDs to search within
 
@@ -456,26 +578,20 @@ def get_xlsx_reports(all_samples, projects) -> list:
     """
     print(f"Searching {len(projects)} projects for samples")
 
-    all_reports = []
-
-    for project in tqdm(projects, ncols=100):
-        project_reports = []
-
-        project_reports = find_in_parallel(
-            project=project,
-            items=all_samples,
-            prefix='.*',
-            suffix='.*xlsx'
-        )
-        all_reports.extend(project_reports)
+    # search all projects from one pool of threads instead of one
+    # project at a time
+    all_reports = find_in_parallel(
+        project=projects,
+        items=[re.escape(x) for x in all_samples],
+        prefix='.*',
+        suffix=r'.*\.xlsx$'
+    )
 
     # filter out any xlsx files found that look to also have a run ID
     # in the name => output from eggd_artemis for a single sample
-    # (example run ID: 240229_A01295_0328_BHYG25DRX3)
     all_reports = [
-        x for x in all_reports if not re.search(
-            r'[\d]+_[A-Z][\d]+_[\d]{4}_[\w][^_]+', x['describe']['name']
-        )
+        x for x in all_reports
+        if not ARTEMIS_RUN_ID_REGEX.search(x['describe']['name'])
     ]
 
     print(f"Found {len(all_reports)} total xlsx reports for all projects")
@@ -516,7 +632,7 @@ def get_single_dir(project, selected_paths) -> list:
             project=project,
             name="*multiqc.html",
             name_mode="glob",
-            describe=True,
+            describe={'fields': {'folder': True}},
         )
     )
 
@@ -549,8 +665,7 @@ def get_multiqc_report(single_path) -> list:
         project=project,
         folder=path,
         name="*-multiqc.html",
-        name_mode='glob',
-        describe=True
+        name_mode='glob'
     ))
 
     return [x['id'] for x in reports]
@@ -693,7 +808,7 @@ def get_latest_genepanels_file() -> dict:
     return latest_file
 
 
-def read_genepanels_file(file_details) -> pd.DataFrame:
+def read_genepanels_file(file_details) -> 'pd.DataFrame':
     """
     Read genepanels file into DataFrame.
 
@@ -704,6 +819,10 @@ def read_genepanels_file(file_details) -> pd.DataFrame:
     row per clinical indication / panel), and adds the test code as a
     separate column.
 
+    The parsed DataFrame is cached locally in GENEPANELS_CACHE_DIR by
+    file ID, and read from here on subsequent runs instead of reading
+    the file from DNAnexus again.
+
     Example resultant dataframe:
 
     +-----------+-----------------------+---------------------------+
@@ -723,31 +842,52 @@ def read_genepanels_file(file_details) -> pd.DataFrame:
     pd.DataFrame
         DataFrame of genepanels file
     """
-    contents = dxpy.DXFile(
+    import pandas as pd
+
+    cached_file = os.path.join(
+        GENEPANELS_CACHE_DIR, f"genepanels_{file_details['id']}.pkl"
+    )
+
+    if os.path.exists(cached_file):
+        print(f"Using cached genepanels file from {cached_file}")
+        return pd.read_pickle(cached_file)
+
+    genepanels_file = dxpy.DXFile(
         project=file_details['project'],
         dxid=file_details['id']
-    ).read().rstrip('\n').split('\n')
+    )
 
     # genepanels file may have 3 or 4 columns as it can also contain HGNC
-    # ID and PanelApp panel ID, just use the first 2 columns
+    # ID and PanelApp panel ID, just use the first 2 columns. The file is
+    # read line by line keeping only the unique rows in order, since the
+    # full file has one row per gene and is much larger than this
+    rows = dict.fromkeys(
+        tuple(line.split('\t')[:2]) for line in genepanels_file if line
+    )
+
     genepanels = pd.DataFrame(
-        [x.split('\t')[:2] for x in contents],
-        columns=['indication', 'panel_name']
+        list(rows), columns=['indication', 'panel_name']
     )
-    genepanels.drop_duplicates(keep='first', inplace=True)
-    genepanels.reset_index(inplace=True, drop=True)
+
+    os.makedirs(GENEPANELS_CACHE_DIR, exist_ok=True)
+    genepanels.to_pickle(cached_file)
 
     return genepanels
 
 
-def upload_manifest(manifest, project, path) -> str:
+def upload_manifest(manifest, name, project, path) -> str:
     """
-    Upload manifest file to DNAnexus
+    Upload manifest contents directly to a file in DNAnexus.
+
+    This does not wait for the file to close, since the dias batch job it
+    is provided to as input will itself wait on the file closing.
 
     Parameters
     ----------
     manifest : str
-        filename of manifest to upload
+        contents of manifest to upload
+    name : str
+        name of manifest file to create
     project : str
         DNAnexus project to upload file to
     path : str
@@ -758,14 +898,12 @@ def upload_manifest(manifest, project, path) -> str:
     str
         file ID of uploaded manifest
     """
-    remote_file = dxpy.upload_local_file(
+    remote_file = dxpy.upload_string(
         manifest,
+        name=name,
         project=project,
         folder=path,
-        wait_on_close=True
+        wait_on_close=False
     )
 
-    # clean up our generated local file
-    os.remove(manifest)
-
     return remote_file.get_id()
@@ -1,19 +1,51 @@
 """
 General utility functions
 """
+import argparse
 from collections import defaultdict
 import concurrent
 from datetime import datetime
 import json
-from os import path
+from os import makedirs, path
 import re
-from typing import List, Union
+import sqlite3
+from time import time
+from typing import List, Union, TYPE_CHECKING
 
 import dxpy
-import pandas as pd
 
+if TYPE_CHECKING:
+    # pandas is imported on use since it is slow to import and not
+    # required when running in download mode
+    import pandas as pd
 
-def call_in_parallel(func, items, ignore_missing=False, **kwargs) -> list:
+
+# local sqlite database of describe details for jobs / analyses that are
+# in a final state, and therefore will not change if described again
+DESCRIBE_CACHE = path.expanduser('~/.cache/dias_reports/describe_cache.db')
+
+FINAL_STATES = ('done', 'failed', 'terminated')
+
+# header lines of Epic style manifest for dias batch
+MANIFEST_HEADER = (
+    "batch\nInstrument ID;Specimen ID;Re-analysis Instrument ID;"
+    "Re-analysis Specimen ID;Test Codes\n"
+)
+
+# patterns matched per sample / test code, compiled once here
+DATE_REGEX = re.compile(r'2[0-9](0[0-9]|1[0-2])[0-3][0-9]')
+REPORT_NAME_REGEX = re.compile(r'[\w]+-[\w\-]+_[\w\-\.:]+\.xlsx')
+TEST_CODE_REGEX = re.compile(r'[RC][\d]+\.[\d]+')
+HGNC_REGEX = re.compile(r'HGNC:[\d]+')
+
+
+def call_in_parallel(
+    func,
+    items,
+    ignore_missing=False,
+    max_workers=32,
+    **kwargs
+    ) -> list:
     """
     Calls the given function in parallel using concurrent.futures on
     the given set of items (i.e for calling dxpy.describe() on multiple
@@ -33,6 +65,8 @@ def call_in_parallel(func, items, ignore_missing=False, **kwargs) -> list:
         exception on a dxpy.exceptions.ResourceNotFound being raised.
         This is most likely from a file that has been deleted and we are
         just going to default to ignoring these
+    max_workers : int
+        maximum number of threads to call the function with at once
 
     Returns
     -------
@@ -41,7 +75,9 @@ def call_in_parallel(func, items, ignore_missing=False, **kwargs) -> list:
     """
     results = []
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=32) as executor:
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers
+    ) as executor:
         concurrent_jobs = {
             executor.submit(func, item, **kwargs): item for item in items
         }
@@ -72,7 +108,181 @@ def call_in_parallel(func, items, ignore_missing=False, **kwargs) -> list:
     return results
 
 
-def date_str_to_datetime(date) -> int:
+def bulk_describe(ids, fields=None, default_fields=True) -> list:
+    """
+    Describes the given DNAnexus object IDs in bulk, using the
+    system/describeExecutions endpoint for jobs / analyses and the
+    system/describeDataObjects endpoint for data objects (i.e. files).
+
+    IDs are queried in chunks of 1000 (the maximum accepted per request)
+    so that N objects only require ceil(N / 1000) API calls, instead of
+    one call per object as with call_in_parallel(dxpy.describe, ...).
+    Where there is more than one chunk these are queried in parallel.
+
+    Any objects that can not be described (i.e. a file that has since
+    been deleted) are skipped with a warning printed.
+
+    Parameters
+    ----------
+    ids : list
+        list of object IDs to describe
+    fields : set | None
+        optional set of fields to return
+    default_fields : bool
+        controls if to also return the default describe fields when
+        `fields` is specified
+
+    Returns
+    -------
+    list
+        list of describe details, in the same order as the given IDs
+    """
+    ids = list(ids)
+
+    describe_options = {}
+    if fields:
+        describe_options = {
+            'fields': {field: True for field in fields},
+            'defaultFields': default_fields
+        }
+
+    def _describe(chunk):
+        """Describe a chunk of IDs using the endpoint for their type"""
+        if chunk[0].startswith(('job-', 'analysis-')):
+            response = dxpy.api.system_describe_executions({
+                'executions': chunk,
+                **describe_options
+            })
+        else:
+            response = dxpy.api.system_describe_data_objects({
+                'objects': chunk,
+                'classDescribeOptions': {'*': describe_options}
+            })
+
+        return dict(zip(chunk, response['results']))
+
+    executions = [x for x in ids if x.startswith(('job-', 'analysis-'))]
+    data_objects = [x for x in ids if not x.startswith(('job-', 'analysis-'))]
+
+    # create chunks of 1000 IDs of each type and query these in parallel
+    chunked_ids = [
+        x[i:i + 1000] for x in (executions, data_objects)
+        for i in range(0, len(x), 1000)
+    ]
+
+    described = {}
+
+    for chunk_details in call_in_parallel(_describe, chunked_ids):
+        described.update(chunk_details)
+
+    results = []
+
+    for item in ids:
+        details = described.get(item, {}).get('describe')
+
+        if not details:
+            print(
+                f'WARNING: {item} could not be described, skipping to not '
+                'raise an exception'
+            )
+            continue
+
+        results.append(details)
+
+    return results
+
+
+def cached_bulk_describe(
+    ids,
+    fields=None,
+    default_fields=True,
+    force=False
+    ) -> list:
+    """
+    Describes the given job / analysis IDs with bulk_describe, caching
+    the describe details of any in a final state (done, failed or
+    terminated) in the local DESCRIBE_CACHE sqlite database.
+
+    On subsequent calls the details for these are read from the cache,
+    and only the remaining IDs are described from DNAnexus. Cached
+    details are stored against the fields requested, so a call with
+    different fields will not return details missing these.
+
+    Parameters
+    ----------
+    ids : list
+        list of job / analysis IDs to describe
+    fields : set | None
+        optional set of fields to return, this should include `id` and
+        `state` if default_fields is False for the details to be cached
+    default_fields : bool
+        controls if to also return the default describe fields when
+        `fields` is specified
+    force : bool
+        controls if to ignore any cached details and describe all IDs
+        from DNAnexus again
+
+    Returns
+    -------
+    list
+        list of describe details, in the same order as the given IDs
+    """
+    ids = list(ids)
+    fields_key = f"{','.join(sorted(fields or []))}:{default_fields}"
+
+    makedirs(path.dirname(DESCRIBE_CACHE), exist_ok=True)
+    conn = sqlite3.connect(DESCRIBE_CACHE)
+
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS describe_cache (id TEXT, fields TEXT, "
+            "state TEXT, describe TEXT, cached_at INTEGER, "
+            "PRIMARY KEY (id, fields))"
+        )
+
+        cached = {}
+
+        if not force:
+            # query in chunks to stay under sqlite's limit of variables
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = conn.execute(
+                    "SELECT id, describe FROM describe_cache WHERE fields = ? "
+                    f"AND id IN ({','.join('?' * len(chunk))})",
+                    [fields_key, *chunk]
+                )
+                cached.update({x: json.loads(y) for x, y in rows})
+
+            if cached:
+                print(f"Using cached describe details for {len(cached)} jobs")
+
+        details = bulk_describe(
+            [x for x in ids if x not in cached],
+            fields=fields,
+            default_fields=default_fields
+        )
+
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO describe_cache VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        x['id'], fields_key, x['state'],
+                        json.dumps(x), int(time())
+                    )
+                    for x in details
+                    if x.get('id') and x.get('state') in FINAL_STATES
+                ]
+            )
+    finally:
+        conn.close()
+
+    described = {**cached, **{x['id']: x for x in details if x.get('id')}}
+
+    return [described[x] for x in ids if x in described]
+
+
+def date_str_to_datetime(date) -> datetime:
     """
     Turn 6 digit date str of yymmdd into datetime object
 
@@ -93,16 +303,41 @@ def date_str_to_datetime(date) -> int:
     """
     date = str(date)
 
-    assert re.fullmatch(r'2[0-9](0[0-9]|1[0-2])[0-3][0-9]', date), (
+    assert DATE_REGEX.fullmatch(date), (
         "Date provided does not seem valid"
     )
 
-    # split parts of date out, removing leading 0 (required for datetime)
-    year, month, day = [
-        int(date[i : i + 2].lstrip("0")) for i in range(0, len(date), 2)
-    ]
+    return datetime.strptime(date, '%y%m%d')
+
+
+def positive_int(value) -> int:
+    """
+    Argparse type for arguments that must be an integer of at least 1
+
+    Parameters
+    ----------
+    value : str
+        value given on the command line
 
-    return datetime(year=int(f"20{year}"), month=month, day=day)
+    Returns
+    -------
+    int
+        value as an integer
+
+    Raises
+    ------
+    argparse.ArgumentTypeError
+        Raised if value is not an integer or is less than 1
+    """
+    try:
+        value = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not an integer")
+
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"{value} must be 1 or greater")
+
+    return value
 
 
 def filter_non_unique_specimen_ids(reports) -> Union[list, dict]:
@@ -129,10 +364,9 @@ def filter_non_unique_specimen_ids(reports) -> Union[list, dict]:
     non_unique = defaultdict(list)
 
     # first map specimen to unique instrument IDs
-    sample_map = defaultdict(list)
+    sample_map = defaultdict(set)
     for report in reports:
-        if report['instrument_id'] not in sample_map[report['specimen_id']]:
-            sample_map[report['specimen_id']].append(report['instrument_id'])
+        sample_map[report['specimen_id']].add(report['instrument_id'])
 
     # split out reports where the specimen matches more than one instrument
     for report in reports:
@@ -158,24 +392,18 @@ def filter_clarity_samples_with_no_reports(clarity_samples, samples_w_reports):
         list of sample identifiers for those with xlsx reports
     """
     # pre-filter all specimen IDs from reports data
-    reports_specimens = [s.get('specimen_id') for s in samples_w_reports]
+    reports_specimens = {s.get('specimen_id') for s in samples_w_reports}
 
-    clarity_w_reports = {
-        specimen: data for specimen, data in clarity_samples.items()
-        if specimen in reports_specimens
-    }
-    clarity_w_out_reports = {
-        specimen: data for specimen, data in clarity_samples.items()
-        if specimen not in reports_specimens
-    }
+    # only the counts are needed => intersect with the keys view instead
+    # of copying out the Clarity data with and without reports
+    total_w_reports = len(clarity_samples.keys() & reports_specimens)
 
     print(
         "Total no. of outstanding samples from Clarity with no prior reports "
-        f"in DNAnexus: {len(clarity_w_out_reports.keys())}"
+        f"in DNAnexus: {len(clarity_samples) - total_w_reports}"
     )
     print(
-        f"Total samples available to run reports for: "
-        f"{len(clarity_w_reports.keys())}"
+        f"Total samples available to run reports for: {total_w_reports}"
     )
 
     # TODO - figure out if we need to do anything return here
@@ -219,19 +447,23 @@ def group_samples_by_project(samples, projects) -> dict:
     list
         report object lists split by project
     """
-    project_samples = defaultdict(lambda: defaultdict(list))
+    project_samples = defaultdict(list)
 
     for sample in samples:
-        project_samples[sample['project']]['samples'].append(sample)
-        project_samples[sample['project']]['project_name'] = projects.get(
-            sample['project']).get('name')
+        project_samples[sample['project']].append(sample)
 
     print(
         f"{len(samples)} samples present in {len(project_samples.keys())} "
         "DNAnexus projects to run reports for"
     )
 
-    return {k: dict(v) for k, v in dict(project_samples).items()}
+    # add the project name once per project instead of once per sample
+    return {
+        project: {
+            'samples': project_sample_list,
+            'project_name': projects.get(project).get('name')
+        } for project, project_sample_list in project_samples.items()
+    }
 
 
 def group_dx_objects_by_project(dx_objects) -> dict:
@@ -273,7 +505,11 @@ def group_dx_objects_by_project(dx_objects) -> dict:
     """
     # first get all project names for the project IDs for the given objects
     projects = set([x['project'] for x in dx_objects])
-    project_details = call_in_parallel(dxpy.describe, projects)
+    project_details = call_in_parallel(
+        dxpy.describe,
+        projects,
+        input_params={'fields': {'id': True, 'name': True}}
+    )
     project_names = dict(set([(x['id'], x['name']) for x in project_details]))
 
     project_objects = defaultdict(lambda: defaultdict(list))
@@ -320,10 +556,10 @@ def add_clarity_data_back_to_samples(samples, clarity_data) -> list:
                 "the specimen ID found in Clarity"
             )
 
-        sample['codes'] = list(set(
-            clarity_data.get(sample['specimen_id']).get('codes')
-        ))
-        sample['date'] = clarity_data.get(sample['specimen_id']).get('date')
+        # codes are already unique from parsing the Clarity export, copy
+        # these to not share the same list between samples
+        sample['codes'] = list(clarity_sample.get('codes'))
+        sample['date'] = clarity_sample.get('date')
 
         merged_sample_data.append(sample)
 
@@ -428,42 +664,31 @@ def filter_reports_with_variants(reports, report_field) -> list:
     list
         list of file IDs of reports with variants to download
     """
-    # get the xlsx report file IDs to find those containing filtered
-    # variants by using the 'included' key in the details metadata,
-    # first filtering out jobs with no output
-    xlsx_report_ids = [
-        job.get('output').get(report_field).get('$dnanexus_link')
+    # map the xlsx report file IDs to the workflow that generated them
+    # to find those containing filtered variants by using the 'included'
+    # key in the details metadata, first filtering out jobs with no output
+    xlsx_report_workflows = {
+        job['output'][report_field]['$dnanexus_link']: job
         for job in reports
-        if job.get('output') and job.get('output').get(report_field)
-    ]
+        if job.get('output') and job['output'].get(report_field)
+    }
 
-    xlsx_details = call_in_parallel(
-        dxpy.describe,
-        xlsx_report_ids,
-        ignore_missing=True,
-        fields={'details'},
-        default_fields=True
+    xlsx_details = bulk_describe(
+        list(xlsx_report_workflows.keys()), fields={'details'}
     )
 
     # get IDs of reports that have filtered variants, details key can
     # either be included or variants because why not so check both
-    xlsx_w_variants = [
+    xlsx_w_variants = {
         x['id'] for x in xlsx_details for field in ['included', 'variants']
         if x['details'].get(field, 0) > 0
-    ]
-
-    # get original reports workflows for the above reports to be able
-    # to just download both the xlsx and coverage reports for those
-    workflows_w_variants = [
-        x for x in reports
-        if x.get('output') and x.get('output').get(
-            report_field, {}).get('$dnanexus_link') in xlsx_w_variants
-    ]
+    }
 
-    # get the file IDs of our output files to download
-    xlsx_ids = [
-        x['output'][report_field]['$dnanexus_link'] for x in workflows_w_variants
-    ]
+    # get the file IDs of our output files to download, along with the
+    # original reports workflows for these to be able to just download
+    # both the xlsx and coverage reports for those
+    xlsx_ids = [x for x in xlsx_report_workflows if x in xlsx_w_variants]
+    workflows_w_variants = [xlsx_report_workflows[x] for x in xlsx_ids]
 
     coverage_ids = [
         x['output'].get('stage-rpt_athena.report', {}).get('$dnanexus_link')
@@ -517,31 +742,40 @@ def parse_clarity_export(export_file) -> dict:
     dict
         dict mapping specimen ID to test code(s) and booked date
     """
-    clarity_df = pd.read_excel(export_file)
-
-    clarity_df['Specimen Identifier'] = clarity_df[
-        'Specimen Identifier'].str.replace('SP-', '')
-
-    # remove any cancelled and pending samples
-    clarity_df = clarity_df[clarity_df['Test Validation Status'] == 'Resulted']
+    import pandas as pd
+
+    # only read in the columns we use from the full export
+    clarity_df = pd.read_excel(
+        export_file,
+        usecols=[
+            'Specimen Identifier',
+            'Test Validation Status',
+            'Test Directory Test Code',
+            'Received Specimen Date Time'
+        ]
+    )
 
+    # remove any cancelled and pending samples before transforming columns
     clarity_df = clarity_df[
-        clarity_df['Test Directory Test Code'] != 'Research Use'
+        (clarity_df['Test Validation Status'] == 'Resulted') &
+        (clarity_df['Test Directory Test Code'] != 'Research Use')
     ]
 
-    clarity_df['Test Directory Test Code'].fillna(value='', inplace=True)
+    specimens = clarity_df['Specimen Identifier'].str.replace('SP-', '')
+    codes = clarity_df['Test Directory Test Code'].fillna(value='')
 
     # turn the date time column into just valid date type
-    clarity_df['Received Specimen Date Time'] = pd.to_datetime(
+    dates = pd.to_datetime(
         clarity_df['Received Specimen Date Time']
     ).dt.strftime('%y%m%d')
 
-    # generate mapping of specimen ID to list of test codes and booked date
+    # generate mapping of specimen ID to list of unique test codes (in
+    # their booked order) and booked date
     sample_code_mapping = {
-        x['Specimen Identifier']: {
-            'codes': x['Test Directory Test Code'].split('|'),
-            'date': date_str_to_datetime(x['Received Specimen Date Time'])
-        } for x in clarity_df.to_dict('records')
+        specimen: {
+            'codes': list(dict.fromkeys(code.split('|'))),
+            'date': date_str_to_datetime(date)
+        } for specimen, code, date in zip(specimens, codes, dates)
     }
 
     return sample_code_mapping
@@ -572,7 +806,7 @@ def parse_sample_identifiers(reports) -> list:
     # that won't pass the below parsing
     invalid = [
         x['describe']['name'] for x in reports if not
-        re.match(r'[\w]+-[\w\-]+_[\w\-\.:]+\.xlsx', x['describe']['name'])
+        REPORT_NAME_REGEX.match(x['describe']['name'])
     ]
 
     if invalid:
@@ -582,25 +816,29 @@ def parse_sample_identifiers(reports) -> list:
         )
 
 
-    samples = [
-        {
-            'project': x['project'],
-            'sample': x['describe']['name'].split('_')[0],
-            'instrument_id': x['describe']['name'].split('-')[0],
-            'specimen_id': x['describe']['name'].split('-')[1]
-        } for x in reports
-    ]
+    # key on all fields to ensure we don't have duplicates from
+    # multiple reports jobs
+    samples = {}
 
-    # ensure we don't have duplicates from multiple reports jobs
-    samples = [dict(s) for s in set(frozenset(d.items()) for d in samples)]
+    for report in reports:
+        name = report['describe']['name']
+        instrument_id, specimen_id = name.split('-')[:2]
+        sample = name.split('_')[0]
+
+        samples[(report['project'], sample, instrument_id, specimen_id)] = {
+            'project': report['project'],
+            'sample': sample,
+            'instrument_id': instrument_id,
+            'specimen_id': specimen_id
+        }
 
     # sort in some order for consistency of returning and testing
-    samples = sorted(samples, key=lambda d: d['sample'])
+    samples = sorted(samples.values(), key=lambda d: d['sample'])
 
     return samples
 
 
-def split_genepanels_test_codes(genepanels) -> pd.DataFrame:
+def split_genepanels_test_codes(genepanels) -> 'pd.DataFrame':
     """
     Split out R/C codes from full CI name for easier matching
     against manifest
@@ -642,17 +880,19 @@ def split_genepanels_test_codes(genepanels) -> pd.DataFrame:
         Raised when test code links to more than one clinical indication
     """
     genepanels['test_code'] = genepanels['indication'].apply(
-        lambda x: x.split('_')[0] if re.match(r'[RC][\d]+\.[\d]+', x) else x
+        lambda x: x.split('_')[0] if TEST_CODE_REGEX.match(x) else x
     )
     genepanels = genepanels[['test_code', 'indication', 'panel_name']]
 
-    # sense check test code only points to one unique indication
-    for code in set(genepanels['test_code'].tolist()):
-        code_rows = genepanels[genepanels['test_code'] == code]
-        if len(set(code_rows['indication'].tolist())) > 1:
+    # sense check test code only points to one unique indication, grouping
+    # once instead of filtering the full dataframe for every test code
+    code_indications = genepanels.groupby('test_code')['indication'].unique()
+
+    for code, indications in code_indications.items():
+        if len(indications) > 1:
             raise RuntimeError(
                 f"Test code {code} linked to more than one indication in "
-                f"genepanels!\n\t{code_rows['indication'].tolist()}"
+                f"genepanels!\n\t{indications.tolist()}"
             )
 
     print(f"Genepanels file: \n{genepanels}")
@@ -686,9 +926,9 @@ def validate_test_codes(all_sample_data, genepanels) -> None:
     invalid = defaultdict(list)
 
     genepanels = split_genepanels_test_codes(genepanels)
-    genepanels_test_codes = sorted(set(genepanels['test_code'].tolist()))
+    genepanels_test_codes = set(genepanels['test_code'].tolist())
 
-    print(f"Current valid test codes:\n\t{genepanels_test_codes}")
+    print(f"Current valid test codes:\n\t{sorted(genepanels_test_codes)}")
 
     for sample_data in all_sample_data:
         sample = sample_data['sample']
@@ -703,7 +943,7 @@ def validate_test_codes(all_sample_data, genepanels) -> None:
             continue
 
         for test in test_codes:
-            if test in genepanels_test_codes or re.search(r'HGNC:[\d]+', test):
+            if test in genepanels_test_codes or HGNC_REGEX.search(test):
                 sample_valid_test.append(test)
             elif test.lower().replace(' ', '') == 'researchuse':
                 # more Epic weirdness, chuck these out but don't break
@@ -739,49 +979,37 @@ def validate_test_codes(all_sample_data, genepanels) -> None:
     return valid, invalid
 
 
-def write_manifest(project_name, sample_data, now, ignore_codes) -> List[dict]:
+def generate_manifest(sample_data, ignore_codes) -> str:
     """
-    Write Epic manifest file of all samples for given project
+    Generate Epic manifest contents of all samples for a given project
 
     Parameters
     ----------
-    project_name : str
-        name of project for naming manifest
     sample_data : list
         list of dicts of sample data (IDs and test code(s))
-    now : str
-        current datetime for naming
     ignore_codes : list
         list of test codes to ignore and not add to the manifest
 
     Returns
     -------
     str
-        file name of manifest generated
+        contents of manifest to upload
     """
     print(f"\nGenerating manifest data for {len(sample_data)} samples")
 
-    manifest = f"{project_name}-{now}_reanalysis.manifest"
-    count = 0
+    rows = []
 
-    with open(manifest, "w") as fh:
-        fh.write(
-            "batch\nInstrument ID;Specimen ID;Re-analysis Instrument ID;"
-            "Re-analysis Specimen ID;Test Codes\n"
+    for sample in sample_data:
+        # sample IDs are the same for every test code row of the sample
+        prefix = f"{sample['instrument_id']};{sample['specimen_id']};;;"
+        rows.extend(
+            f"{prefix}{code}\n" for code in sample['codes']
+            if code not in ignore_codes
         )
 
-        for sample in sample_data:
-            codes = [x for x in sample['codes'] if x not in ignore_codes]
-            for code in codes:
-                fh.write(
-                    f"{sample['instrument_id']};{sample['specimen_id']}"
-                    f";;;{code}\n"
-                )
-                count += 1
-
-    print(f"{count} sample - test codes written to file {manifest}")
+    print(f"{len(rows)} sample - test codes added to manifest")
 
-    return manifest
+    return MANIFEST_HEADER + ''.join(rows)
 
 
 def write_to_log(log_file, key, job_ids) -> None:
@@ -845,6 +1073,6 @@ def read_from_log(log_file) -> dict:
     assert log_file.endswith('.json'), 'JSON file not provided to read from'
 
     with open(log_file) as fh:
-        contents = json.loads(fh.read())
+        contents = json.load(fh)
 
     return contents
@@ -1,6 +1,7 @@
 """Tests for dx_manage"""
 import concurrent
 import os
+import tempfile
 from uuid import uuid4
 from random import shuffle
 
@@ -8,6 +9,7 @@ import unittest
 from unittest.mock import patch
 
 import dxpy
+import pandas as pd
 import pytest
 
 from bin.utils import dx_manage
@@ -118,14 +120,33 @@ class TestCheckArchivalState(unittest.TestCase):
             assert archived == expected_archived
 
     @patch("bin.utils.dx_manage.find_in_parallel")
-    def test_correct_number_files_searched_for(self, mock_find):
+    def test_output_prefixed_with_project(self, mock_find):
+        """
+        Function is called for multiple projects concurrently, test that
+        all output is prefixed with the project ID to be able to follow
+        """
+        mock_find.return_value = self.returned_file_details
+
+        dx_manage.check_archival_state(
+            project="project-xxx",
+            sample_data={
+                "samples": [{"sample": "sample1"}, {"sample": "sample2"}]
+            },
+        )
+
+        stdout = self.capsys.readouterr().out.splitlines()
+
+        assert stdout and all(
+            x.startswith("[project-xxx] ") for x in stdout
+        ), "Output not prefixed with project ID"
+
+    @patch("bin.utils.dx_manage.find_in_parallel")
+    def test_correct_files_searched_for(self, mock_find):
         """
         When searching in DNAnexus, there are a set number of patterns
         defined in the function that are searched for each sample provided
-        in the sample data.
-
-        We will use the number of files printed to stdout as a proxy for
-        the correct list of patterns being built since we don't return them.
+        in the sample data. These are grouped into a single regex pattern
+        per sample, plus one for the run level excluded intervals bed.
         """
         dx_manage.check_archival_state(
             project="project-xxx",
@@ -134,15 +155,71 @@ class TestCheckArchivalState(unittest.TestCase):
             },
         )
 
-        # since we pass 2 samples, we expect 2 * 8 patterns plus the
-        # run level excluded intervals bed => 17 file patterns
-        stdout = self.capsys.readouterr().out
+        file_group = (
+            "(?:_segments.vcf$|_copy_ratios.gcnv.bed.gz$|"
+            "_copy_ratios.gcnv.bed.gz.tbi$|_markdup.per-base.bed.gz$|"
+            "_markdup_recalibrated_Haplotyper.vcf.gz$|"
+            "_markdup.reference_build.txt$|bam$|bam.bai$)"
+        )
 
-        expected_stdout = "17 sample files to search for"
+        expected_items = [
+            f"sample1.*{file_group}",
+            f"sample2.*{file_group}",
+            ".*_excluded_intervals.bed"
+        ]
 
-        assert (
-            expected_stdout in stdout
-        ), "Wrong no. files identified to check archival state of"
+        # order of samples is not retained, compare sorted
+        assert sorted(mock_find.call_args[1]['items']) == sorted(
+            expected_items
+        ), "Wrong files identified to check archival state of"
+
+
+@patch('bin.utils.dx_manage.check_archival_state')
+class TestCheckArchivalStateBulk(unittest.TestCase):
+    """
+    Tests for dx_manage.check_archival_state_bulk
+
+    Function calls check_archival_state concurrently for each of the
+    given projects and returns the states mapped to each project ID
+    """
+    project_samples = {
+        'project-xxx': {'samples': [{'sample': 'sample1'}]},
+        'project-yyy': {'samples': [{'sample': 'sample2'}]}
+    }
+
+    def test_states_returned_per_project(self, mock_check):
+        """
+        Test that the returned states are correctly mapped to the
+        project they were checked for
+        """
+        mock_check.side_effect = lambda project, sample_data: (
+            [f"{project}-live"], [], []
+        )
+
+        returned_states = dx_manage.check_archival_state_bulk(
+            project_samples=self.project_samples
+        )
+
+        expected_states = {
+            'project-xxx': (['project-xxx-live'], [], []),
+            'project-yyy': (['project-yyy-live'], [], [])
+        }
+
+        assert returned_states == expected_states, (
+            'archival states not correctly returned per project'
+        )
+
+
+    def test_error_raised_on_failed_check(self, mock_check):
+        """
+        Test that an error checking any project is raised
+        """
+        mock_check.side_effect = RuntimeError('test error')
+
+        with pytest.raises(RuntimeError, match='test error'):
+            dx_manage.check_archival_state_bulk(
+                project_samples=self.project_samples
+            )
 
 
 class TestCheckJobState(unittest.TestCase):
@@ -358,6 +435,37 @@ class TestUnarchiveFiles(unittest.TestCase):
 
         self.assertEqual(mock_unarchive.call_count, 3)
 
+    @patch("bin.utils.dx_manage.dxpy.api.project_unarchive")
+    @patch("bin.utils.dx_manage.exit")
+    def test_total_files_across_projects_printed(self, exit, mock_unarchive):
+        """
+        Test that the total number of files being unarchived across all
+        projects is printed, and not just those of the last project
+        """
+        files = {
+            **self.files,
+            "project-yyy": [
+                {
+                    "project": "project-yyy",
+                    "id": "file-zzz",
+                    "describe": {
+                        "name": "sample3-file1",
+                        "archivalState": "archived",
+                    },
+                }
+            ]
+        }
+
+        dx_manage.unarchive_files(files)
+
+        stdout = self.capsys.readouterr().out
+
+        with self.subTest('total files printed'):
+            assert 'Unarchiving requested for 3 files' in stdout
+
+        with self.subTest('all file IDs in check state command'):
+            assert 'echo file-xxx file-yyy file-zzz |' in stdout
+
     @patch(
         "bin.utils.dx_manage.dxpy.api.project_unarchive",
         side_effect=Exception("someDNAnexusAPIError"),
@@ -428,6 +536,42 @@ class TestDownloadSingleFile(unittest.TestCase):
             assert mock_describe.call_count == 1
 
 
+    def test_given_file_details_used_without_describing(
+        self, mock_download, mock_describe
+    ):
+        """
+        Test that when the file details are given in file_details that
+        these are used and the file is not described again
+        """
+        file_details = {
+            'file-xxx': {
+                'id': 'file-xxx',
+                'name': 'sample1.xlsx',
+                'parts': {'1': {'size': 1}}
+            }
+        }
+
+        dx_manage.download_single_file(
+            dxid='file-xxx',
+            project='project-xxx',
+            path='local_dir/sub_dir',
+            file_details=file_details
+        )
+
+        with self.subTest('correct download file path'):
+            given_path = mock_download.call_args[0][1]
+
+            assert given_path == 'local_dir/sub_dir/sample1.xlsx'
+
+        with self.subTest('describe details passed to download'):
+            assert mock_download.call_args[1]['describe_output'] == (
+                file_details['file-xxx']
+            )
+
+        with self.subTest('dxpy.describe not called'):
+            assert mock_describe.call_count == 0
+
+
 class TestCreateFolder(unittest.TestCase):
     """
     Tests for dx_manage.create_folder
@@ -488,6 +632,29 @@ class TestFindInParallel(unittest.TestCase):
             'items not correctly chunked for concurrent searching'
         )
 
+    def test_all_chunks_searched_in_all_projects(self, mock_submit, mock_find):
+        """
+        Test that when a list of projects is given, every chunk of items
+        is searched for in every project
+        """
+        dx_manage.find_in_parallel(
+            project=['project-xxx', 'project-yyy'],
+            items=[f"sample_{x}" for x in range(350)]
+        )
+
+        searched = sorted(
+            (x[1]['project'], x[1]['name'].split('|')[0])
+            for x in mock_find.call_args_list
+        )
+
+        expected = sorted(
+            (project, f"sample_{x}")
+            for project in ['project-xxx', 'project-yyy']
+            for x in [0, 100, 200, 300]
+        )
+
+        assert searched == expected, 'chunks not searched in all projects'
+
     def test_results_correctly_returned_as_single_list(self, mock_submit, mock_find):
         """
         Test that when we call the find in parallel that we correctly
@@ -632,10 +799,10 @@ class TestGetJobStates(unittest.TestCase):
     """
     Tests for dx_manage.get_job_states
 
-    Function calls dxpy.describe in parallel using utils.call_in_parallel
-    of a given list of job IDs and returns a mapping of the job ID to its state
+    Function describes the given list of job IDs in bulk using
+    utils.bulk_describe and returns a mapping of the job ID to its state
     """
-    @patch('bin.utils.dx_manage.call_in_parallel')
+    @patch('bin.utils.dx_manage.bulk_describe')
     def test_correct_states_returned(self, mock_parallel):
         """
         Test that the correct format is returned
@@ -674,8 +841,24 @@ class TestGetJobStates(unittest.TestCase):
 
         assert returned_states == expected_states, "job states incorrectly parsed"
 
+    @patch('bin.utils.dx_manage.bulk_describe')
+    def test_error_raised_for_jobs_not_described(self, mock_describe):
+        """
+        Test that if any job is missing from the describe response (i.e.
+        it could not be described) that a RuntimeError is raised
+        """
+        mock_describe.return_value = [
+            {
+                "id": "job-xxx",
+                "state": "running"
+            }
+        ]
+
+        with pytest.raises(RuntimeError, match=r'1 job\(s\): job-yyy'):
+            dx_manage.get_job_states(["job-xxx", "job-yyy"])
 
-@patch('bin.utils.dx_manage.dxpy.describe')
+
+@patch('bin.utils.dx_manage.cached_bulk_describe')
 class TestGetLaunchedWorkflowIds(unittest.TestCase):
     """
     Tests for dx_manage.get_launched_workflow_ids
@@ -689,7 +872,7 @@ class TestGetLaunchedWorkflowIds(unittest.TestCase):
         Test that the launched jobs get correctly returned
         """
         # minimal describe return on each job
-        mock_describe.side_effect = [
+        mock_describe.return_value = [
             {
                 'id': 'job-xxx',
                 'state': 'done',
@@ -733,6 +916,8 @@ class TestGetLaunchedWorkflowIds(unittest.TestCase):
         Test when there are no batch jobs that the function just returns
         an empty list
         """
+        mock_decribe.return_value = []
+
         jobs, analyses = dx_manage.get_launched_workflow_ids([])
 
         assert (jobs, analyses) == ([], []), 'output incorrect for no input jobs'
@@ -743,7 +928,7 @@ class TestGetLaunchedWorkflowIds(unittest.TestCase):
         Test that failed jobs dias_batch are excluded correctly
         """
         # minimal describe return on each job
-        mock_describe.side_effect = [
+        mock_describe.return_value = [
             {
                 'id': 'job-xxx',
                 'state': 'done',
@@ -837,15 +1022,19 @@ class TestGetXlsxReports(unittest.TestCase):
     @patch('bin.utils.dx_manage.find_in_parallel')
     def test_all_projects_searched(self, mock_parallel):
         """
-        Test that for the given list of `n` projects, we call
-        find_in_parallel `n` times
+        Test that all of the given projects are searched with a single
+        call to find_in_parallel
         """
         dx_manage.get_xlsx_reports(
             all_samples=self.samples,
             projects=self.projects
         )
 
-        assert mock_parallel.call_count == 3, "not called for all projects"
+        with self.subTest('called once'):
+            assert mock_parallel.call_count == 1
+
+        with self.subTest('all projects searched'):
+            assert mock_parallel.call_args[1]['project'] == self.projects
 
     @patch('bin.utils.dx_manage.dxpy.find_data_objects')
     def test_correct_search_pattern_generated(self, mock_find):
@@ -861,7 +1050,9 @@ class TestGetXlsxReports(unittest.TestCase):
         # mocked function passed arguments are stored as 2nd item in tuple
         built_pattern = mock_find.call_args[1]['name']
 
-        expected_pattern = ".*sample_1.*xlsx|.*sample_2.*xlsx|.*sample_3.*xlsx"
+        expected_pattern = (
+            r".*sample_1.*\.xlsx$|.*sample_2.*\.xlsx$|.*sample_3.*\.xlsx$"
+        )
 
         assert built_pattern == expected_pattern, (
             "Search pattern not as expected"
@@ -876,37 +1067,31 @@ class TestGetXlsxReports(unittest.TestCase):
         """
         # mock returning one sample from each report plus additional
         # run file that should be filtered
-        mock_parallel.side_effect = [
-            [
-                {
-                    "id": "file-aaa",
-                    "describe": {
-                        "name": "sample1.xlsx"
-                    }
+        mock_parallel.return_value = [
+            {
+                "id": "file-aaa",
+                "describe": {
+                    "name": "sample1.xlsx"
                 }
-            ],
-            [
-                {
-                    "id": "file-bbb",
-                    "describe": {
-                        "name": "sample2.xlsx"
-                    }
+            },
+            {
+                "id": "file-bbb",
+                "describe": {
+                    "name": "sample2.xlsx"
                 }
-            ],
-            [
-                {
-                    "id": "file-ccc",
-                    "describe": {
-                        "name": "sample3.xlsx"
-                    }
-                },
-                {
-                    "id": "file-ddd",
-                    "describe": {
-                        "name": "240229_A01295_0328_BHYG25DRX3_240620.xlsx"
-                    }
+            },
+            {
+                "id": "file-ccc",
+                "describe": {
+                    "name": "sample3.xlsx"
                 }
-            ]
+            },
+            {
+                "id": "file-ddd",
+                "describe": {
+                    "name": "240229_A01295_0328_BHYG25DRX3_240620.xlsx"
+                }
+            }
         ]
 
         returned_reports = dx_manage.get_xlsx_reports(
@@ -1284,16 +1469,32 @@ class TestReadGenepanelsFile(unittest.TestCase):
     indication and panel name columns as a DataFrame
     """
     # read the contents of the example genepanels we have stored in the
-    # test data dir to patch in reading from DNAnexus, call read() to
-    # return contents as a string like is done in DXFile.read()
+    # test data dir to patch in reading from DNAnexus, split to lines
+    # without newlines like is returned from iterating over a DXFile
     with open(os.path.join(TEST_DATA_DIR, 'genepanels.tsv')) as fh:
-        contents = fh.read()
+        contents = fh.read().splitlines()
+
+    def setUp(self):
+        """
+        Use an empty cache dir per test so that each parses the file
+        instead of reading back a previous test's cached output
+        """
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+        self.cache_patch = patch(
+            'bin.utils.dx_manage.GENEPANELS_CACHE_DIR', self.cache_dir.name
+        )
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        self.cache_dir.cleanup()
 
     def test_contents_correctly_parsed(self, mock_file):
         """
         Test that the contents are correctly parsed
         """
-        mock_file.return_value.read.return_value = self.contents
+        mock_file.return_value.__iter__.return_value = iter(self.contents)
 
         parsed_genepanels = dx_manage.read_genepanels_file(
             file_details={
@@ -1337,35 +1538,82 @@ class TestReadGenepanelsFile(unittest.TestCase):
             assert len(parsed_genepanels['panel_name'].unique().tolist()) == 318
 
 
-@patch('bin.utils.dx_manage.dxpy.upload_local_file')
+    def test_cached_file_used_on_subsequent_calls(self, mock_file):
+        """
+        Test that once a genepanels file has been read it is cached and
+        not read from DNAnexus again
+        """
+        mock_file.return_value.__iter__.return_value = iter(self.contents)
+
+        file_details = {
+            "project": "project-Fkb6Gkj433GVVvj73J7x8KbV",
+            "id": f"file-{uuid4().hex}"
+        }
+
+        first_read = dx_manage.read_genepanels_file(file_details=file_details)
+        second_read = dx_manage.read_genepanels_file(file_details=file_details)
+
+        with self.subTest('file only read once from DNAnexus'):
+            assert mock_file.return_value.__iter__.call_count == 1
+
+        with self.subTest('cached contents match'):
+            assert first_read.equals(second_read)
+
+    def test_existing_cached_file_returned(self, mock_file):
+        """
+        Test that where a parsed genepanels file is already cached for
+        the file ID that it is returned without reading from DNAnexus
+        """
+        cached = pd.DataFrame(
+            [['C1.1_Inherited Stroke', 'CUH_Inherited Stroke_1.0']],
+            columns=['indication', 'panel_name']
+        )
+        cached.to_pickle(
+            os.path.join(self.cache_dir.name, 'genepanels_file-xxx.pkl')
+        )
+
+        returned = dx_manage.read_genepanels_file(
+            file_details={"project": "project-xxx", "id": "file-xxx"}
+        )
+
+        with self.subTest('file not read from DNAnexus'):
+            mock_file.assert_not_called()
+
+        with self.subTest('cached contents returned'):
+            assert returned.equals(cached)
+
+
+@patch('bin.utils.dx_manage.dxpy.upload_string')
 class TestUploadManifest(unittest.TestCase):
     """
     Tests for dx_manage.upload_manifest
 
-    Function calls dxpy.upload_local_file to perform the upload, deletes
-    the local file and then returns the uploaded file ID
+    Function calls dxpy.upload_string to upload the manifest contents
+    directly to a new file and then returns the uploaded file ID
     """
 
-    def test_local_file_removed(self, mock_upload):
+    def test_contents_uploaded_to_named_file(self, mock_upload):
         """
-        Test that the local file is removed after calling upload
+        Test that the manifest contents are uploaded to a file with the
+        given name in the given project and path
         """
-        # generate random file
-        test_file = os.path.join(TEST_DATA_DIR, uuid4().hex)
-
-        open(test_file, 'w').close()
-
         dx_manage.upload_manifest(
-            manifest=test_file,
+            manifest='batch\n',
+            name='test.manifest',
             project='project-xxx',
-            path='/'
+            path='/manifests'
         )
 
-        assert not os.path.exists(test_file), 'local file not deleted'
+        mock_upload.assert_called_once_with(
+            'batch\n',
+            name='test.manifest',
+            project='project-xxx',
+            folder='/manifests',
+            wait_on_close=False
+        )
 
 
-    @patch('bin.utils.dx_manage.os.remove')
-    def test_id_returned_from_dxfile_object(self, mock_remove, mock_upload):
+    def test_id_returned_from_dxfile_object(self, mock_upload):
         """
         Test that the uploaded file ID is correctly returned from the
         DXFile object
@@ -1378,6 +1626,7 @@ class TestUploadManifest(unittest.TestCase):
 
         file_id = dx_manage.upload_manifest(
             manifest='',
+            name='test.manifest',
             project='project-xxx',
             path='/'
         )
@@ -0,0 +1,162 @@
+"""Tests for run_reports"""
+import argparse
+import os
+import sys
+from time import sleep
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# run_reports imports its utils relative to bin/ as when run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '../bin'))
+
+import run_reports
+
+
+@patch('run_reports.write_to_log')
+@patch('run_reports.get_latest_dias_batch_app', return_value='app-xxx')
+@patch('run_reports.launch_batch_job')
+class TestRunAllBatchJobs(unittest.TestCase):
+    """
+    Tests for run_reports.run_all_batch_jobs
+
+    Function launches dias batch for every project concurrently, where
+    launching fails for any project any not yet started are cancelled,
+    those already launched are written to the log and the error raised
+    """
+    args = argparse.Namespace(ignore_test_codes=None)
+
+    @pytest.fixture(autouse=True)
+    def capsys(self, capsys):
+        """Capture stdout to provide it to tests"""
+        self.capsys = capsys
+
+    def test_all_launched_jobs_returned(self, mock_launch, mock_app, mock_log):
+        """
+        Test that where all launches succeed the job IDs are returned and
+        nothing is written to the log from here
+        """
+        mock_launch.side_effect = lambda project, **kwargs: f"job-{project}"
+
+        launched = run_reports.run_all_batch_jobs(
+            args=self.args,
+            all_sample_data={'project-aaa': {}, 'project-bbb': {}},
+            log_file='test_log.json'
+        )
+
+        with self.subTest('all jobs returned'):
+            assert sorted(launched) == ['job-project-aaa', 'job-project-bbb']
+
+        with self.subTest('log not written'):
+            mock_log.assert_not_called()
+
+    def test_failure_stops_launching_and_logs_launched_jobs(
+            self, mock_launch, mock_app, mock_log
+        ):
+        """
+        Test that when one launch fails any projects not yet started are
+        cancelled, the jobs that did launch are written to the log and
+        the error is raised
+        """
+        def launch(project, **kwargs):
+            if project == 'project-000':
+                raise RuntimeError('failed to launch')
+
+            # keep the other launches running whilst the failure is handled
+            sleep(0.2)
+
+            return f"job-{project}"
+
+        mock_launch.side_effect = launch
+
+        # more projects than there are threads, so that some are queued
+        projects = {f"project-{i:03}": {} for i in range(40)}
+
+        with pytest.raises(RuntimeError, match='failed to launch'):
+            run_reports.run_all_batch_jobs(
+                args=self.args,
+                all_sample_data=projects,
+                log_file='test_log.json'
+            )
+
+        started = [x[1]['project'] for x in mock_launch.call_args_list]
+        launched = sorted(f"job-{x}" for x in started if x != 'project-000')
+
+        with self.subTest('queued launches cancelled'):
+            assert len(started) < len(projects)
+
+        with self.subTest('launched jobs written to log'):
+            mock_log.assert_called_once()
+
+            assert mock_log.call_args[1]['log_file'] == 'test_log.json'
+            assert mock_log.call_args[1]['key'] == 'dias_batch'
+            assert sorted(mock_log.call_args[1]['job_ids']) == launched
+
+    def test_nothing_logged_if_no_jobs_launched(
+            self, mock_launch, mock_app, mock_log
+        ):
+        """
+        Test that if launching fails before any jobs launch that the
+        error is raised without writing to the log or printing an empty
+        list of launched jobs
+        """
+        mock_launch.side_effect = RuntimeError('failed to launch')
+
+        with pytest.raises(RuntimeError, match='failed to launch'):
+            run_reports.run_all_batch_jobs(
+                args=self.args,
+                all_sample_data={'project-aaa': {}},
+                log_file='test_log.json'
+            )
+
+        with self.subTest('log not written'):
+            mock_log.assert_not_called()
+
+        with self.subTest('no launched jobs printed'):
+            assert 'Jobs launched before stopping' not in (
+                self.capsys.readouterr().out
+            )
+
+
+class TestVerifyBatchInputsArgument(unittest.TestCase):
+    """
+    Tests for run_reports.verify_batch_inputs_argument
+
+    Function parses the JSON string given to --batch_inputs and checks
+    all given inputs are valid inputs to eggd_dias_batch
+    """
+    def test_valid_inputs_pass(self):
+        """
+        Test that valid inputs pass and are returned parsed, including
+        both sample_limit and unarchive which were previously joined to
+        one name by a missing comma in the valid inputs
+        """
+        args = argparse.Namespace(
+            batch_inputs='{"sample_limit": 1, "unarchive": true}'
+        )
+
+        returned_args = run_reports.verify_batch_inputs_argument(args)
+
+        assert returned_args.batch_inputs == {
+            "sample_limit": 1, "unarchive": True
+        }
+
+    def test_invalid_input_raises_assertion_error(self):
+        """
+        Test that an input not accepted by eggd_dias_batch raises an
+        AssertionError
+        """
+        args = argparse.Namespace(batch_inputs='{"sample_limitunarchive": 1}')
+
+        with pytest.raises(AssertionError, match='sample_limitunarchive'):
+            run_reports.verify_batch_inputs_argument(args)
+
+    def test_invalid_json_raises_runtime_error(self):
+        """
+        Test that a string that is not valid JSON raises a RuntimeError
+        """
+        args = argparse.Namespace(batch_inputs='{"unarchive": True}')
+
+        with pytest.raises(RuntimeError, match='as JSON string'):
+            run_reports.verify_batch_inputs_argument(args)
@@ -1,7 +1,9 @@
+import argparse
 from copy import deepcopy
 from datetime import datetime, timedelta
 import json
 import os
+import tempfile
 import unittest
 from unittest.mock import patch
 from uuid import uuid4
@@ -121,6 +123,250 @@ class TestCallInParallel(unittest.TestCase):
             assert expected_stdout in self.capsys.readouterr().out
 
 
+class TestBulkDescribe(unittest.TestCase):
+    """
+    Tests for utils.bulk_describe
+
+    Function describes a list of object IDs in chunks of 1000 using the
+    system/describeExecutions and system/describeDataObjects endpoints,
+    returning the describe details in the same order as the given IDs
+    """
+    @pytest.fixture(autouse=True)
+    def capsys(self, capsys):
+        """Capture stdout to provide it to tests"""
+        self.capsys = capsys
+
+
+    @patch('bin.utils.utils.dxpy.api.system_describe_data_objects')
+    @patch('bin.utils.utils.dxpy.api.system_describe_executions')
+    def test_ids_split_by_endpoint(self, mock_executions, mock_objects):
+        """
+        Test that jobs / analyses are described with describeExecutions
+        and files with describeDataObjects
+        """
+        mock_executions.return_value = {
+            'results': [
+                {'describe': {'id': 'job-xxx'}},
+                {'describe': {'id': 'analysis-xxx'}}
+            ]
+        }
+        mock_objects.return_value = {
+            'results': [{'describe': {'id': 'file-xxx'}}]
+        }
+
+        utils.bulk_describe(['job-xxx', 'file-xxx', 'analysis-xxx'])
+
+        with self.subTest('executions'):
+            assert mock_executions.call_args[0][0]['executions'] == [
+                'job-xxx', 'analysis-xxx'
+            ]
+
+        with self.subTest('data objects'):
+            assert mock_objects.call_args[0][0]['objects'] == ['file-xxx']
+
+
+    @patch('bin.utils.utils.dxpy.api.system_describe_data_objects')
+    @patch('bin.utils.utils.dxpy.api.system_describe_executions')
+    def test_order_of_given_ids_preserved(self, mock_executions, mock_objects):
+        """
+        Test that the returned details are in the same order as the
+        given IDs regardless of which endpoint described them
+        """
+        mock_executions.return_value = {
+            'results': [
+                {'describe': {'id': 'job-xxx'}},
+                {'describe': {'id': 'analysis-xxx'}}
+            ]
+        }
+        mock_objects.return_value = {
+            'results': [{'describe': {'id': 'file-xxx'}}]
+        }
+
+        returned = utils.bulk_describe(['job-xxx', 'file-xxx', 'analysis-xxx'])
+
+        assert [x['id'] for x in returned] == [
+            'job-xxx', 'file-xxx', 'analysis-xxx'
+        ], 'order of given IDs not preserved'
+
+
+    @patch('bin.utils.utils.dxpy.api.system_describe_data_objects')
+    def test_ids_chunked_by_1000(self, mock_objects):
+        """
+        Test that more than 1000 IDs are split across multiple calls
+        """
+        mock_objects.side_effect = lambda x: {
+            'results': [{'describe': {'id': i}} for i in x['objects']]
+        }
+
+        file_ids = [f"file-{x}" for x in range(2500)]
+
+        returned = utils.bulk_describe(file_ids)
+
+        with self.subTest('number of calls'):
+            assert mock_objects.call_count == 3
+
+        with self.subTest('all returned'):
+            assert [x['id'] for x in returned] == file_ids
+
+
+    @patch('bin.utils.utils.dxpy.api.system_describe_data_objects')
+    def test_fields_correctly_passed(self, mock_objects):
+        """
+        Test that given fields are passed through as describe options
+        in addition to the default fields
+        """
+        mock_objects.return_value = {
+            'results': [{'describe': {'id': 'file-xxx'}}]
+        }
+
+        utils.bulk_describe(['file-xxx'], fields={'details'})
+
+        expected_options = {
+            '*': {
+                'fields': {'details': True},
+                'defaultFields': True
+            }
+        }
+
+        assert mock_objects.call_args[0][0][
+            'classDescribeOptions'] == expected_options
+
+
+    @patch('bin.utils.utils.dxpy.api.system_describe_executions')
+    def test_default_fields_can_be_excluded(self, mock_executions):
+        """
+        Test that default fields are not requested when default_fields
+        is False
+        """
+        mock_executions.return_value = {
+            'results': [{'describe': {'id': 'job-xxx'}}]
+        }
+
+        utils.bulk_describe(
+            ['job-xxx'], fields={'id', 'state'}, default_fields=False
+        )
+
+        assert mock_executions.call_args[0][0] == {
+            'executions': ['job-xxx'],
+            'fields': {'id': True, 'state': True},
+            'defaultFields': False
+        }
+
+
+    @patch('bin.utils.utils.dxpy.api.system_describe_data_objects')
+    def test_objects_not_described_skipped(self, mock_objects):
+        """
+        Test that objects that could not be described are skipped and
+        a warning printed
+        """
+        mock_objects.return_value = {
+            'results': [
+                {'describe': {'id': 'file-xxx'}},
+                {'error': {'type': 'ResourceNotFound'}}
+            ]
+        }
+
+        returned = utils.bulk_describe(['file-xxx', 'file-yyy'])
+
+        with self.subTest('missing object skipped'):
+            assert returned == [{'id': 'file-xxx'}]
+
+        with self.subTest('warning printed'):
+            assert (
+                'WARNING: file-yyy could not be described'
+                in self.capsys.readouterr().out
+            )
+
+
+class TestCachedBulkDescribe(unittest.TestCase):
+    """
+    Tests for utils.cached_bulk_describe
+
+    Function wraps bulk_describe, caching the details of jobs in a final
+    state in a local sqlite database and reading these back on later calls
+    """
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.cache_dir.name, 'describe_cache.db')
+        self.patch_cache = patch(
+            'bin.utils.utils.DESCRIBE_CACHE', self.cache
+        )
+        self.patch_cache.start()
+
+        self.fields = {'id', 'state'}
+
+
+    def tearDown(self):
+        self.patch_cache.stop()
+        self.cache_dir.cleanup()
+
+
+    @patch('bin.utils.utils.bulk_describe')
+    def test_final_state_jobs_not_described_again(self, mock_describe):
+        """
+        Test that jobs in a final state are returned from the cache on
+        the second call and only in progress jobs are described again
+        """
+        mock_describe.return_value = [
+            {'id': 'job-xxx', 'state': 'done'},
+            {'id': 'job-yyy', 'state': 'running'}
+        ]
+
+        utils.cached_bulk_describe(
+            ['job-xxx', 'job-yyy'], fields=self.fields, default_fields=False
+        )
+
+        mock_describe.return_value = [{'id': 'job-yyy', 'state': 'done'}]
+
+        returned = utils.cached_bulk_describe(
+            ['job-xxx', 'job-yyy'], fields=self.fields, default_fields=False
+        )
+
+        with self.subTest('only in progress job described'):
+            assert mock_describe.call_args[0][0] == ['job-yyy']
+
+        with self.subTest('order of returned details'):
+            assert returned == [
+                {'id': 'job-xxx', 'state': 'done'},
+                {'id': 'job-yyy', 'state': 'done'}
+            ]
+
+
+    @patch('bin.utils.utils.bulk_describe')
+    def test_cache_not_used_for_different_fields(self, mock_describe):
+        """
+        Test that cached details are not returned when describing with
+        different fields to those they were cached with
+        """
+        mock_describe.return_value = [{'id': 'job-xxx', 'state': 'done'}]
+
+        utils.cached_bulk_describe(
+            ['job-xxx'], fields=self.fields, default_fields=False
+        )
+        utils.cached_bulk_describe(
+            ['job-xxx'], fields={'id', 'state', 'output'}, default_fields=False
+        )
+
+        assert mock_describe.call_args[0][0] == ['job-xxx']
+
+
+    @patch('bin.utils.utils.bulk_describe')
+    def test_force_ignores_cache(self, mock_describe):
+        """
+        Test that when force=True all jobs are described again
+        """
+        mock_describe.return_value = [{'id': 'job-xxx', 'state': 'done'}]
+
+        utils.cached_bulk_describe(
+            ['job-xxx'], fields=self.fields, default_fields=False
+        )
+        utils.cached_bulk_describe(
+            ['job-xxx'], fields=self.fields, default_fields=False, force=True
+        )
+
+        assert mock_describe.call_args[0][0] == ['job-xxx']
+
+
 class TestDateStrToDatetime(unittest.TestCase):
     """
     Tests for utils.date_to_datetime
@@ -165,6 +411,34 @@ class TestDateStrToDatetime(unittest.TestCase):
                 utils.date_str_to_datetime(invalid)
 
 
+class TestPositiveInt(unittest.TestCase):
+    """
+    Tests for utils.positive_int
+
+    Function is used as an argparse type to ensure the given value is
+    an integer of 1 or greater
+    """
+    def test_valid_values_returned_as_int(self):
+        """
+        Test that valid values are returned as integers
+        """
+        for value, expected in [('1', 1), ('5', 5), ('120', 120)]:
+            with self.subTest(value=value):
+                assert utils.positive_int(value) == expected
+
+
+    def test_invalid_values_raise_error(self):
+        """
+        Test that zero, negative and non integer values raise an
+        argparse.ArgumentTypeError
+        """
+        for invalid in ['0', '-1', '-120', '1.5', 'foo']:
+            with self.subTest(value=invalid), pytest.raises(
+                argparse.ArgumentTypeError
+            ):
+                utils.positive_int(invalid)
+
+
 class TestFilterNonUniqueSpecimenIds(unittest.TestCase):
     """
     Tests for utils.filter_non_unique_specimen_ids
@@ -568,6 +842,60 @@ class TestGroupDxObjectsByProject(unittest.TestCase):
         )
 
 
+@patch('bin.utils.utils.dxpy.api.project_describe')
+class TestGroupDxObjectsByProjectDescribe(unittest.TestCase):
+    """
+    Tests for the project describe calls made from
+    utils.group_dx_objects_by_project, these go through
+    utils.call_in_parallel and dxpy.describe unmocked to check what is
+    passed through to the DNAnexus API
+    """
+    dx_objects = [
+        {
+            'id': 'file-xxx',
+            'project': 'project-Fkb6Gkj433GVVvj73J7x8KbV'
+        },
+        {
+            'id': 'file-yyy',
+            'project': 'project-GgXvB984QX3xF6qkPK4Kp5xx'
+        }
+    ]
+
+    def test_only_project_names_requested(self, mock_describe):
+        """
+        Test that each project is described once requesting only the
+        id and name fields
+        """
+        mock_describe.side_effect = lambda project, **kwargs: {
+            'id': project, 'name': f'{project}-name'
+        }
+
+        returned_objects = utils.group_dx_objects_by_project(
+            self.dx_objects
+        )
+
+        with self.subTest('each project described once'):
+            assert sorted(
+                [x[0][0] for x in mock_describe.call_args_list]
+            ) == sorted([x['project'] for x in self.dx_objects])
+
+        with self.subTest('only id and name fields requested'):
+            for call in mock_describe.call_args_list:
+                assert call[1] == {
+                    'input_params': {'fields': {'id': True, 'name': True}}
+                }
+
+        with self.subTest('project names returned'):
+            assert {
+                k: v['project_name'] for k, v in returned_objects.items()
+            } == {
+                'project-Fkb6Gkj433GVVvj73J7x8KbV':
+                    'project-Fkb6Gkj433GVVvj73J7x8KbV-name',
+                'project-GgXvB984QX3xF6qkPK4Kp5xx':
+                    'project-GgXvB984QX3xF6qkPK4Kp5xx-name'
+            }
+
+
 class TestAddClarityDataBackToSamples(unittest.TestCase):
     """
     Tests for utils.add_clarity_data_back_to_samples.
@@ -940,7 +1268,7 @@ class TestLimitSamples(unittest.TestCase):
             assert expected_stdout in self.capsys.readouterr().out
 
 
-@patch('bin.utils.utils.call_in_parallel')
+@patch('bin.utils.utils.bulk_describe')
 class TestFilterReportsWithVariants(unittest.TestCase):
     """
     Tests for utils.filter_reports_with_variants
@@ -1715,16 +2043,16 @@ class TestValidateTestCodes(unittest.TestCase):
             assert '111111-23251R0041' not in samples
 
 
-class TestWriteManifest(unittest.TestCase):
+class TestGenerateManifest(unittest.TestCase):
     """
-    Tests for utils.write_manifest
+    Tests for utils.generate_manifest
 
-    Function writes an Epic style manifest for running with Dias batch
+    Function generates an Epic style manifest for running with Dias batch
     """
-    def test_contents_written_as_expected(self):
+    def test_contents_generated_as_expected(self):
         """
-        Test that the file contents are written as expected form the
-        given sample data
+        Test that the manifest contents are generated as expected from
+        the given sample data
         """
         sample_data = [
             {
@@ -1760,19 +2088,12 @@ class TestWriteManifest(unittest.TestCase):
            "333333;444R4444;;;HGNC:1234\n"
         ]
 
-        manifest = utils.write_manifest(
-            project_name='test',
+        manifest = utils.generate_manifest(
             sample_data=sample_data,
-            now='240813',
             ignore_codes=ignore_codes
         )
 
-        with open(manifest, 'r') as fh:
-            written_contents = fh.readlines()
-
-        os.remove(manifest)
-
-        assert expected_contents == written_contents, (
+        assert expected_contents == manifest.splitlines(keepends=True), (
             'Manifest contents not as expected'
         )
 